@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import pathlib
+from collections.abc import Iterable, Iterator, Mapping
 from typing import Protocol, runtime_checkable
 
 
@@ -27,6 +28,22 @@ class Archiver(Protocol):
     def __init__(self) -> None:
         self.path = pathlib.Path()
 
+    def open_session(self) -> None:
+        """
+        Starts a session on the current archive.
+        While a session is open an archiver may keep file handles and parsed directory information between calls.
+        Sessions may be nested, resources should only be released when the outermost session is closed.
+        Writes to the archive must invalidate anything cached during a session.
+        """
+        return None
+
+    def close_session(self) -> None:
+        """
+        Ends a session started with open_session.
+        Should never cause an exception.
+        """
+        return None
+
     def get_comment(self) -> str:
         """
         Returns the comment from the current archive as a string.
@@ -56,6 +73,32 @@ class Archiver(Protocol):
         """
         raise NotImplementedError
 
+    def read_file_head(self, archive_file: str, size: int) -> bytes:
+        """
+        Reads at most size bytes from the start of the named file.
+        Archivers that can stop decompressing part way through a file should override this.
+        Should always return a bytes object. Exceptions should be of the type OSError.
+        """
+        return self.read_file(archive_file)[:size]
+
+    def get_file_size(self, archive_file: str) -> int:
+        """
+        Returns the uncompressed size of the named file.
+        Archivers that store the size in the archive directory should override this.
+        Exceptions should be of the type OSError.
+        """
+        return len(self.read_file(archive_file))
+
+    def read_files(self, archive_files: Iterable[str]) -> Iterator[tuple[str, bytes]]:
+        """
+        Reads the named files from the current archive, yielding (archive_file, data) tuples.
+        Files may be yielded in any order, archivers that have to decompress or run an external program
+        for every read should override this so that all of the files are extracted in one pass.
+        Exceptions should be of the type OSError.
+        """
+        for archive_file in archive_files:
+            yield archive_file, self.read_file(archive_file)
+
     def remove_file(self, archive_file: str) -> bool:
         """
         Removes the named file from the current archive.
@@ -73,6 +116,21 @@ class Archiver(Protocol):
         """
         return False
 
+    def write_files(self, files: Mapping[str, bytes], comment: str | None = None) -> bool:
+        """
+        Writes all of the given files and the comment (if it is not None) to the current archive.
+        The comment is ignored if the archive does not support comments.
+        Archivers that rebuild the archive or run an external program for every write should override this
+        so that all of the changes are made in one operation.
+        Should always return a boolean. Failures should return False.
+        """
+        for archive_file, data in files.items():
+            if not self.write_file(archive_file, data):
+                return False
+        if comment is not None and self.supports_comment():
+            return self.set_comment(comment)
+        return True
+
     def get_filename_list(self) -> list[str]:
         """
         Returns a list of filenames in the current archive.
@@ -80,6 +138,16 @@ class Archiver(Protocol):
         """
         return []
 
+    def get_manifest(self) -> list[tuple[str, int, int]]:
+        """
+        Returns a (filename, uncompressed size, checksum) tuple for each file in the current archive.
+        This should only use information from the archive directory (eg the zip central directory), no file data
+        should be read. The checksum is the CRC if the format stores one, otherwise any value that changes
+        when the file does (eg the mtime).
+        Should always return a list. Failures should return an empty list.
+        """
+        return [(filename, 0, 0) for filename in self.get_filename_list()]
+
     def supports_files(self) -> bool:
         """
         Returns True if the current archive supports arbitrary non-picture files.
@@ -95,6 +163,19 @@ class Archiver(Protocol):
         """
         return False
 
+    def verify(self) -> bool:
+        """
+        Returns True if every file in the current archive can be read and passes any integrity checks the format has.
+        This is expected to be slow, is_valid should only do the minimum needed to open the archive.
+        Should always return a boolean. Failures should return False.
+        """
+        try:
+            for filename in self.get_filename_list():
+                self.read_file(filename)
+        except Exception:
+            return False
+        return True
+
     def is_writable(self) -> bool:
         """
         Retuns True if the current archive is writeable
@@ -116,6 +197,16 @@ class Archiver(Protocol):
         """
         return ""
 
+    @classmethod
+    def sniff(cls, path: pathlib.Path, head: bytes, tail: bytes) -> bool:
+        """
+        Returns False if the given path cannot be opened by this archiver, judging only by its file signature.
+        head and tail are the first and last few KB of the file, both are empty if the path is a directory.
+        This is checked before is_valid and should not touch the filesystem.
+        Should always return a boolean. The default returns True so that is_valid is always called.
+        """
+        return True
+
     @classmethod
     def is_valid(cls, path: pathlib.Path) -> bool:
         """
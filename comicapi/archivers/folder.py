@@ -16,6 +16,10 @@ class FolderArchiver(Archiver):
         super().__init__()
         self.comment_file_name = "ComicTaggerFolderComment.txt"
 
+        # The file listing is cached until the mtime of one of the listed directories changes
+        self._filenames: list[str] | None = None
+        self._dir_mtimes: dict[str, int] = {}
+
     def get_comment(self) -> str:
         try:
             return (self.path / self.comment_file_name).read_text()
@@ -39,7 +43,19 @@ class FolderArchiver(Archiver):
 
         return data
 
+    def read_file_head(self, archive_file: str, size: int) -> bytes:
+        try:
+            with (self.path / archive_file).open("rb") as f:
+                return f.read(size)
+        except OSError as e:
+            logger.error("Error reading folder archive [%s]: %s :: %s", e, self.path, archive_file)
+            raise
+
+    def get_file_size(self, archive_file: str) -> int:
+        return (self.path / archive_file).stat().st_size
+
     def remove_file(self, archive_file: str) -> bool:
+        self._filenames = None
         try:
             (self.path / archive_file).unlink(missing_ok=True)
         except OSError as e:
@@ -49,6 +65,7 @@ class FolderArchiver(Archiver):
             return True
 
     def write_file(self, archive_file: str, data: bytes) -> bool:
+        self._filenames = None
         try:
             file_path = self.path / archive_file
             file_path.parent.mkdir(exist_ok=True, parents=True)
@@ -61,21 +78,58 @@ class FolderArchiver(Archiver):
             return True
 
     def get_filename_list(self) -> list[str]:
+        if self._filenames is None or not self._listing_is_current():
+            try:
+                self._filenames, self._dir_mtimes = self._scan()
+            except OSError as e:
+                logger.error("Error listing files in folder archive [%s]: %s", e, self.path)
+                self._filenames = None
+                return []
+        return list(self._filenames)
+
+    def _scan(self) -> tuple[list[str], dict[str, int]]:
+        """Lists every file below the folder, directory symlinks are not followed like os.walk"""
         filenames = []
+        dir_mtimes = {}
+        dirs = [(os.fspath(self.path), "")]
+        while dirs:
+            directory, prefix = dirs.pop()
+            # stat before listing so that a change during the listing is noticed next time
+            dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            dirs.append((entry.path, f"{prefix}{entry.name}/"))
+                    else:
+                        filenames.append(f"{prefix}{entry.name}")
+        return filenames, dir_mtimes
+
+    def _listing_is_current(self) -> bool:
+        if os.fspath(self.path) not in self._dir_mtimes:
+            return False
         try:
-            for root, _dirs, files in os.walk(self.path):
-                for f in files:
-                    filenames.append(os.path.relpath(os.path.join(root, f), self.path).replace(os.path.sep, "/"))
-            return filenames
-        except OSError as e:
-            logger.error("Error listing files in folder archive [%s]: %s", e, self.path)
-            return []
+            return all(os.stat(directory).st_mtime_ns == mtime for directory, mtime in self._dir_mtimes.items())
+        except OSError:
+            return False
+
+    def get_manifest(self) -> list[tuple[str, int, int]]:
+        manifest = []
+        for filename in self.get_filename_list():
+            try:
+                stat = (self.path / filename).stat()
+            except OSError as e:
+                logger.error("Error listing files in folder archive [%s]: %s :: %s", e, self.path, filename)
+                continue
+            manifest.append((filename, stat.st_size, stat.st_mtime_ns))
+        return manifest
 
     def supports_files(self) -> bool:
         return True
 
     def copy_from_archive(self, other_archive: Archiver) -> bool:
         """Replace the current zip with one copied from another archive"""
+        self._filenames = None
         try:
             for filename in other_archive.get_filename_list():
                 data = other_archive.read_file(filename)
@@ -99,6 +153,10 @@ class FolderArchiver(Archiver):
     def name(self) -> str:
         return "Folder"
 
+    @classmethod
+    def sniff(cls, path: pathlib.Path, head: bytes, tail: bytes) -> bool:
+        return not head and not tail
+
     @classmethod
     def is_valid(cls, path: pathlib.Path) -> bool:
         return path.is_dir()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import logging
 import os
 import pathlib
@@ -8,6 +9,7 @@ import shutil
 import subprocess
 import tempfile
 import time
+from collections.abc import Iterable, Iterator, Mapping
 
 from comicapi.archivers import Archiver
 
@@ -34,12 +36,12 @@ class RarArchiver(Archiver):
     def __init__(self) -> None:
         super().__init__()
 
-        # windows only, keeps the cmd.exe from popping up
-        if platform.system() == "Windows":
-            self.startupinfo = subprocess.STARTUPINFO()  # type: ignore
-            self.startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW  # type: ignore
-        else:
-            self.startupinfo = None
+        self.startupinfo = _startupinfo()
+
+        # The parsed archive is cached and keyed on the path, mtime and size of the file it was read from
+        self._rarc: rarfile.RarFile | None = None
+        self._rarc_key: tuple[pathlib.Path, int, int] | None = None
+        self._infos: dict[str, rarfile.RarInfo] = {}
 
     def get_comment(self) -> str:
         rarc = self.get_rar_obj()
@@ -72,6 +74,7 @@ class RarArchiver(Archiver):
                         encoding="utf-8",
                         cwd=tmp_dir,
                     )
+                self._invalidate()
                 if result.returncode != 0:
                     logger.error(
                         "Error writing comment to rar archive [exitcode: %d]: %s :: %s",
@@ -103,8 +106,9 @@ class RarArchiver(Archiver):
         while tries < 7:
             try:
                 tries = tries + 1
-                data: bytes = rarc.open(archive_file).read()
-                entries = [(rarc.getinfo(archive_file), data)]
+                info = self._infos.get(archive_file) or rarc.getinfo(archive_file)
+                data: bytes = rarc.open(info).read()
+                entries = [(info, data)]
 
                 if entries[0][0].file_size != len(entries[0][1]):
                     logger.info(
@@ -120,6 +124,10 @@ class RarArchiver(Archiver):
             except OSError as e:
                 logger.error("Error reading rar archive [%s]: %s :: %s :: tries #%d", e, self.path, archive_file, tries)
                 time.sleep(1)
+                self._invalidate()
+                rarc = self.get_rar_obj()
+                if rarc is None:
+                    break
             except Exception as e:
                 logger.error(
                     "Unexpected exception reading rar archive [%s]: %s :: %s :: tries #%d",
@@ -139,6 +147,68 @@ class RarArchiver(Archiver):
 
         raise OSError
 
+    def read_files(self, archive_files: Iterable[str]) -> Iterator[tuple[str, bytes]]:
+        archive_files = list(archive_files)
+        rarc = self.get_rar_obj()
+        # rarfile reads stored files itself, compressed files need the rar executable once per file
+        compressed = [
+            archive_file
+            for archive_file in archive_files
+            if archive_file in self._infos and self._infos[archive_file].compress_type != rarfile.RAR_M0
+        ]
+        if rarc is None or len(compressed) < 2 or not (os.path.exists(self.exe) or shutil.which(self.exe)):
+            yield from super().read_files(archive_files)
+            return
+
+        remaining = dict.fromkeys(archive_files)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = pathlib.Path(tmp_dir)
+            list_file = tmp_path / "files.lst"
+            list_file.write_text("\n".join(compressed), encoding="utf-8")
+            rar_cwd = tmp_path / "rar"
+            rar_cwd.mkdir()
+
+            # use external program to extract all of the files in one pass
+            result = subprocess.run(
+                [
+                    self.exe,
+                    "x",
+                    "-y",
+                    "-c-",
+                    "-idq",
+                    "-scfl",
+                    str(self.path.absolute()),
+                    f"@{list_file}",
+                    f"{rar_cwd}{os.sep}",
+                ],
+                startupinfo=self.startupinfo,
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                encoding="utf-8",
+                cwd=rar_cwd,
+            )
+            if result.returncode != 0:
+                logger.error(
+                    "Error extracting from rar archive [exitcode: %d]: %s :: %s",
+                    result.returncode,
+                    self.path,
+                    result.stderr,
+                )
+            else:
+                for archive_file in compressed:
+                    extracted = rar_cwd / archive_file
+                    if (
+                        extracted.resolve().is_relative_to(rar_cwd.resolve())
+                        and extracted.is_file()
+                        and extracted.stat().st_size == self._infos[archive_file].file_size
+                    ):
+                        yield archive_file, extracted.read_bytes()
+                        del remaining[archive_file]
+
+        # Anything the bulk extraction missed is read one at a time
+        for archive_file in remaining:
+            yield archive_file, self.read_file(archive_file)
+
     def remove_file(self, archive_file: str) -> bool:
         if self.exe:
             working_dir = os.path.dirname(os.path.abspath(self.path))
@@ -152,6 +222,7 @@ class RarArchiver(Archiver):
                 cwd=self.path.absolute().parent,
             )
 
+            self._invalidate()
             if platform.system() == "Darwin":
                 time.sleep(1)
             if result.returncode != 0:
@@ -191,6 +262,7 @@ class RarArchiver(Archiver):
                 cwd=self.path.absolute().parent,
             )
 
+            self._invalidate()
             if platform.system() == "Darwin":
                 time.sleep(1)
             if result.returncode != 0:
@@ -207,6 +279,57 @@ class RarArchiver(Archiver):
         else:
             return False
 
+    def write_files(self, files: Mapping[str, bytes], comment: str | None = None) -> bool:
+        if not self.exe:
+            return False
+        if not files:
+            return comment is None or self.set_comment(comment)
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                tmp_path = pathlib.Path(tmp_dir)
+                rar_cwd = tmp_path / "rar"
+                rar_cwd.mkdir()
+                working_dir = os.path.dirname(os.path.abspath(self.path))
+
+                for archive_file, data in files.items():
+                    (rar_cwd / archive_file).parent.mkdir(exist_ok=True, parents=True)
+                    (rar_cwd / archive_file).write_bytes(data)
+
+                # use external program to write all files (and the comment) to the Rar archive at once
+                proc_args = [self.exe, "a", f"-w{working_dir}", "-c-"]
+                if comment is not None:
+                    comment_file = tmp_path / "rar_comment.txt"
+                    comment_file.write_text(comment, encoding="utf-8")
+                    proc_args.append(f"-z{comment_file}")
+                proc_args.append(str(self.path.absolute()))
+                proc_args.extend(str(pathlib.PurePath(archive_file)) for archive_file in files)
+
+                result = subprocess.run(
+                    proc_args,
+                    startupinfo=self.startupinfo,
+                    stdin=subprocess.DEVNULL,
+                    capture_output=True,
+                    encoding="utf-8",
+                    cwd=rar_cwd,
+                )
+
+            self._invalidate()
+            if platform.system() == "Darwin":
+                time.sleep(1)
+            if result.returncode != 0:
+                logger.error(
+                    "Error writing rar archive [exitcode: %d]: %s :: %s :: %s",
+                    result.returncode,
+                    self.path,
+                    ", ".join(files),
+                    result.stderr,
+                )
+                return False
+        except OSError as e:
+            logger.exception("Error writing rar archive [%s]: %s :: %s", e, self.path, ", ".join(files))
+            return False
+        return True
+
     def get_filename_list(self) -> list[str]:
         rarc = self.get_rar_obj()
         tries = 0
@@ -215,7 +338,7 @@ class RarArchiver(Archiver):
                 try:
                     tries = tries + 1
                     namelist = []
-                    for item in rarc.infolist():
+                    for item in self._infos.values():
                         if item.file_size != 0:
                             namelist.append(item.filename)
 
@@ -227,6 +350,11 @@ class RarArchiver(Archiver):
                     return namelist
         return []
 
+    def get_manifest(self) -> list[tuple[str, int, int]]:
+        if self.get_rar_obj() is None:
+            return []
+        return [(info.filename, info.file_size, info.CRC) for info in self._infos.values() if info.file_size != 0]
+
     def supports_files(self) -> bool:
         return True
 
@@ -265,28 +393,26 @@ class RarArchiver(Archiver):
 
                 self.path.unlink(missing_ok=True)
                 shutil.move(rar_path, self.path)
+                self._invalidate()
         except Exception as e:
             logger.exception("Error while copying to rar archive [%s]: from %s to %s", e, other_archive.path, self.path)
             return False
         else:
             return True
 
-    def is_writable(self) -> bool:
+    def verify(self) -> bool:
+        rarc = self.get_rar_obj()
+        if rarc is None:
+            return False
         try:
-            if bool(self.exe and (os.path.exists(self.exe) or shutil.which(self.exe))):
-                return (
-                    subprocess.run(
-                        (self.exe,),
-                        startupinfo=self.startupinfo,
-                        capture_output=True,
-                        cwd=self.path.absolute().parent,
-                    )
-                    .stdout.strip()
-                    .startswith(b"RAR")
-                )
-        except OSError:
-            ...
-        return False
+            rarc.testrar()
+        except (OSError, rarfile.Error) as e:
+            logger.error("Error verifying rar archive [%s]: %s", e, self.path)
+            return False
+        return True
+
+    def is_writable(self) -> bool:
+        return _can_write(self.exe)
 
     def extension(self) -> str:
         return ".cbr"
@@ -294,31 +420,96 @@ class RarArchiver(Archiver):
     def name(self) -> str:
         return "RAR"
 
+    @classmethod
+    def sniff(cls, path: pathlib.Path, head: bytes, tail: bytes) -> bool:
+        # RAR 1.5-4.x and RAR 5 signatures share this prefix
+        return head.startswith(b"Rar!\x1a\x07")
+
     @classmethod
     def is_valid(cls, path: pathlib.Path) -> bool:
         if rar_support:
-            # Try using exe
-            orig = rarfile.UNRAR_TOOL
-            rarfile.UNRAR_TOOL = cls.exe
-            try:
-                return rarfile.is_rarfile(str(path)) and rarfile.tool_setup(sevenzip=False, sevenzip2=False, force=True)
-            except rarfile.RarCannotExec:
-                rarfile.UNRAR_TOOL = orig
-
-            # Fallback to standard
-            try:
-                return rarfile.is_rarfile(str(path)) and rarfile.tool_setup(force=True)
-            except rarfile.RarCannotExec as e:
-                logger.info(e)
+            return rarfile.is_rarfile(str(path)) and _tool_setup(cls.exe)
         return False
 
+    @classmethod
+    def open(cls, path: pathlib.Path) -> Archiver:
+        # Archives restored from the library index are opened without calling is_valid
+        if rar_support:
+            _tool_setup(cls.exe)
+        return super().open(path)
+
     def get_rar_obj(self) -> rarfile.RarFile | None:
         if rar_support:
             try:
+                stat = self.path.stat()
+                key = (self.path, stat.st_mtime_ns, stat.st_size)
+                if self._rarc is not None and self._rarc_key == key:
+                    return self._rarc
+
                 rarc = rarfile.RarFile(str(self.path))
             except (OSError, rarfile.RarFileError) as e:
                 logger.error("Unable to get rar object [%s]: %s", e, self.path)
+                self._invalidate()
             else:
+                self._rarc = rarc
+                self._rarc_key = key
+                self._infos = {info.filename: info for info in rarc.infolist()}
                 return rarc
 
         return None
+
+    def _invalidate(self) -> None:
+        """Drops the cached rar object, must be called after modifying the archive"""
+        self._rarc = None
+        self._rarc_key = None
+        self._infos = {}
+
+
+@functools.lru_cache(maxsize=None)
+def _tool_setup(exe: str) -> bool:
+    """Points rarfile at an extraction tool, probing for the tool only happens once per exe"""
+    # Try using exe
+    orig = rarfile.UNRAR_TOOL
+    rarfile.UNRAR_TOOL = exe
+    try:
+        rarfile.tool_setup(sevenzip=False, sevenzip2=False, force=True)
+        return True
+    except rarfile.RarCannotExec:
+        rarfile.UNRAR_TOOL = orig
+
+    # Fallback to standard
+    try:
+        rarfile.tool_setup(force=True)
+        return True
+    except rarfile.RarCannotExec as e:
+        logger.info(e)
+    return False
+
+
+@functools.lru_cache(maxsize=None)
+def _can_write(exe: str) -> bool:
+    """Checks that exe is the rar executable, the program is only run once per exe"""
+    try:
+        if bool(exe and (os.path.exists(exe) or shutil.which(exe))):
+            result = subprocess.run((exe,), startupinfo=_startupinfo(), stdin=subprocess.DEVNULL, capture_output=True)
+            banner = result.stdout.strip()
+            logger.debug("rar executable %s: %s", exe, banner.partition(b"\n")[0].decode("utf-8", errors="replace"))
+            return banner.startswith(b"RAR")
+    except OSError:
+        ...
+    return False
+
+
+def clear_tool_cache() -> None:
+    """Forgets what is known about the rar executables, should be called if RarArchiver.exe or PATH changes"""
+    _tool_setup.cache_clear()
+    _can_write.cache_clear()
+
+
+def _startupinfo() -> subprocess.STARTUPINFO | None:  # type: ignore[name-defined]
+    # windows only, keeps the cmd.exe from popping up
+    if platform.system() == "Windows":
+        startupinfo = subprocess.STARTUPINFO()  # type: ignore
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW  # type: ignore
+        return startupinfo
+    return None
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import contextlib
+import io
 import logging
 import os
 import pathlib
+import queue
 import shutil
 import tempfile
+import threading
+from collections.abc import Iterable, Iterator, Mapping
 
 from comicapi.archivers import Archiver
 
@@ -34,35 +39,72 @@ class SevenZipArchiver(Archiver):
         return False
 
     def read_file(self, archive_file: str) -> bytes:
-        data = b""
-        try:
-            with py7zr.SevenZipFile(self.path, "r") as zf:
-                data = zf.read([archive_file])[archive_file].read()
-        except (py7zr.Bad7zFile, OSError) as e:
-            logger.error("Error reading 7zip archive [%s]: %s :: %s", e, self.path, archive_file)
-            raise
+        for _, data in self.read_files([archive_file]):
+            return data
+        logger.error("Error reading 7zip archive [file not found]: %s :: %s", self.path, archive_file)
+        raise OSError(f"{archive_file} not found in {self.path}")
+
+    def read_files(self, archive_files: Iterable[str]) -> Iterator[tuple[str, bytes]]:
+        """
+        Decompresses all of the named files in one pass.
+        py7zr treats all archives as if they used solid compression, reading files one at a time
+        decompresses everything before each file again.
+        Files are yielded as soon as they are decompressed, extraction runs in a separate thread
+        and is paused while the consumer is busy.
+        """
+        targets = list(archive_files)
+        if not targets:
+            return
 
-        return data
+        factory = _StreamFactory()
+
+        def extract() -> None:
+            try:
+                with py7zr.SevenZipFile(self.path, "r") as zf:
+                    zf.extract(targets=targets, factory=factory)
+                factory.finish()
+            except BaseException as e:
+                with contextlib.suppress(_Cancelled):
+                    factory.put(e)
+
+        thread = threading.Thread(target=extract, name=f"7z {self.path.name}", daemon=True)
+        thread.start()
+        try:
+            while (item := factory.queue.get()) is not None:
+                if isinstance(item, BaseException):
+                    logger.error("Error reading 7zip archive [%s]: %s :: %s", item, self.path, ", ".join(targets))
+                    if isinstance(item, (py7zr.Bad7zFile, OSError)):
+                        raise item
+                    raise OSError(item) from item
+                yield item
+        finally:
+            factory.cancelled.set()
+            thread.join()
 
     def remove_file(self, archive_file: str) -> bool:
         return self.rebuild([archive_file])
 
     def write_file(self, archive_file: str, data: bytes) -> bool:
+        return self.write_files({archive_file: data})
+
+    def write_files(self, files: Mapping[str, bytes], comment: str | None = None) -> bool:
         # At the moment, no other option but to rebuild the whole
-        # archive w/o the indicated file. Very sucky, but maybe
+        # archive w/o the indicated files. Very sucky, but maybe
         # another solution can be found
-        files = self.get_filename_list()
-        if archive_file in files:
-            if not self.rebuild([archive_file]):
+        existing = set(self.get_filename_list())
+        replaced = [f for f in files if f in existing]
+        if replaced:
+            if not self.rebuild(replaced):
                 return False
 
         try:
-            # now just add the archive file as a new one
+            # now just add the archive files as new ones
             with py7zr.SevenZipFile(self.path, "a") as zf:
-                zf.writestr(data, archive_file)
+                for archive_file, data in files.items():
+                    zf.writestr(data, archive_file)
             return True
         except (py7zr.Bad7zFile, OSError) as e:
-            logger.error("Error writing 7zip archive [%s]: %s :: %s", e, self.path, archive_file)
+            logger.error("Error writing 7zip archive [%s]: %s :: %s", e, self.path, ", ".join(files))
             return False
 
     def get_filename_list(self) -> list[str]:
@@ -75,6 +117,16 @@ class SevenZipArchiver(Archiver):
             logger.error("Error listing files in 7zip archive [%s]: %s", e, self.path)
             return []
 
+    def get_manifest(self) -> list[tuple[str, int, int]]:
+        try:
+            with py7zr.SevenZipFile(self.path, "r") as zf:
+                return [
+                    (file.filename, file.uncompressed, file.crc32 or 0) for file in zf.list() if not file.is_directory
+                ]
+        except (py7zr.Bad7zFile, OSError) as e:
+            logger.error("Error listing files in 7zip archive [%s]: %s", e, self.path)
+            return []
+
     def supports_files(self) -> bool:
         return True
 
@@ -91,9 +143,8 @@ class SevenZipArchiver(Archiver):
                 targets = [f for f in zin.getnames() if f not in exclude_list]
             with tempfile.NamedTemporaryFile(dir=os.path.dirname(self.path), delete=False) as tmp_file:
                 with py7zr.SevenZipFile(tmp_file.file, mode="w") as zout:
-                    with py7zr.SevenZipFile(self.path, mode="r") as zin:
-                        for filename, buffer in zin.read(targets).items():
-                            zout.writef(buffer, filename)
+                    for filename, data in self.read_files(targets):
+                        zout.writestr(data, filename)
 
                 self.path.unlink(missing_ok=True)
                 tmp_file.close()  # Required on windows
@@ -108,18 +159,26 @@ class SevenZipArchiver(Archiver):
         """Replace the current zip with one copied from another archive"""
         try:
             with py7zr.SevenZipFile(self.path, "w") as zout:
-                for filename in other_archive.get_filename_list():
-                    data = other_archive.read_file(
-                        filename
-                    )  # This will be very inefficient if other_archive is a 7z file
-                    if data is not None:
-                        zout.writestr(data, filename)
+                for filename, data in other_archive.read_files(other_archive.get_filename_list()):
+                    zout.writestr(data, filename)
         except Exception as e:
             logger.error("Error while copying to 7zip archive [%s]: from %s to %s", e, other_archive.path, self.path)
             return False
         else:
             return True
 
+    def verify(self) -> bool:
+        try:
+            with py7zr.SevenZipFile(self.path, "r") as zf:
+                bad_file = zf.testzip()
+            if bad_file is not None:
+                logger.error("Error verifying 7zip archive: %s :: %s", self.path, bad_file)
+                return False
+            return True
+        except (py7zr.Bad7zFile, OSError) as e:
+            logger.error("Error verifying 7zip archive [%s]: %s", e, self.path)
+            return False
+
     def is_writable(self) -> bool:
         return True
 
@@ -129,6 +188,77 @@ class SevenZipArchiver(Archiver):
     def name(self) -> str:
         return "Seven Zip"
 
+    @classmethod
+    def sniff(cls, path: pathlib.Path, head: bytes, tail: bytes) -> bool:
+        return head.startswith(b"7z\xbc\xaf\x27\x1c")
+
     @classmethod
     def is_valid(cls, path: pathlib.Path) -> bool:
         return py7zr.is_7zfile(path)
+
+
+class _Cancelled(Exception):
+    """Raised in the extraction thread when the consumer of read_files stops early"""
+
+
+if z7_support:
+
+    class _StreamIO(py7zr.io.Py7zIO):
+        def __init__(self, filename: str, factory: _StreamFactory) -> None:
+            self.filename = filename
+            self.factory = factory
+            self.buffer = io.BytesIO()
+            self.sent = False
+
+        def write(self, s: bytes | bytearray) -> int:
+            return self.buffer.write(s)
+
+        def read(self, size: int | None = None) -> bytes:
+            return self.buffer.read(size)
+
+        def seek(self, offset: int, whence: int = 0) -> int:
+            return self.buffer.seek(offset, whence)
+
+        def flush(self) -> None:
+            return None
+
+        def size(self) -> int:
+            return self.buffer.getbuffer().nbytes
+
+        def close(self) -> None:
+            # py7zr calls this once the file has been completely decompressed
+            self.send()
+
+        def send(self) -> None:
+            if not self.sent:
+                self.sent = True
+                self.factory.put((self.filename, self.buffer.getvalue()))
+                self.buffer = io.BytesIO()
+
+    class _StreamFactory(py7zr.io.WriterFactory):
+        """Passes decompressed files from the extraction thread to read_files through a small queue"""
+
+        def __init__(self) -> None:
+            self.queue: queue.Queue[tuple[str, bytes] | BaseException | None] = queue.Queue(maxsize=2)
+            self.cancelled = threading.Event()
+            self.products: list[_StreamIO] = []
+
+        def create(self, filename: str) -> py7zr.io.Py7zIO:
+            product = _StreamIO(filename, self)
+            self.products.append(product)
+            return product
+
+        def put(self, item: tuple[str, bytes] | BaseException | None) -> None:
+            while not self.cancelled.is_set():
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            raise _Cancelled
+
+        def finish(self) -> None:
+            # Older versions of py7zr do not close the files they extract
+            for product in self.products:
+                product.send()
+            self.put(None)
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+import contextlib
+import copy
 import logging
 import os
 import pathlib
 import shutil
 import tempfile
+import threading
 import zipfile
+from collections.abc import Iterator, Mapping
 from typing import cast
 
 import chardet
 
+from comicapi import utils
 from comicapi.archivers import Archiver
 
 logger = logging.getLogger(__name__)
@@ -20,12 +25,64 @@ class ZipArchiver(Archiver):
 
     def __init__(self) -> None:
         super().__init__()
+        self._session_depth = 0
+        # _close_zip waits on this until no thread is reading from the session ZipFile
+        self._session_lock = threading.Condition(threading.RLock())
+        self._readers = 0
+        self._zf: zipfile.ZipFile | None = None
+        self._zf_path: pathlib.Path | None = None
+
+    def open_session(self) -> None:
+        with self._session_lock:
+            self._session_depth += 1
+
+    def close_session(self) -> None:
+        with self._session_lock:
+            self._session_depth = max(self._session_depth - 1, 0)
+            if self._session_depth == 0:
+                self._close_zip()
+
+    @contextlib.contextmanager
+    def _reader(self) -> Iterator[zipfile.ZipFile]:
+        """Yields the session ZipFile if a session is open, otherwise a ZipFile that is closed afterwards"""
+        if self._session_depth:
+            with self._session_lock:
+                if self._zf is None or self._zf_path != self.path:
+                    self._close_zip()
+                    self._zf = zipfile.ZipFile(self.path, mode="r")
+                    self._zf_path = self.path
+                zf = self._zf
+                self._readers += 1
+            try:
+                yield zf
+            finally:
+                with self._session_lock:
+                    self._readers -= 1
+                    self._session_lock.notify_all()
+        else:
+            with zipfile.ZipFile(self.path, mode="r") as zf:
+                yield zf
+
+    def _close_zip(self) -> None:
+        """
+        Closes the session ZipFile once the reads in progress finish, it is re-opened on the next read.
+        Must be called before writing.
+        """
+        with self._session_lock:
+            self._session_lock.wait_for(lambda: self._readers == 0)
+            if self._zf is not None:
+                try:
+                    self._zf.close()
+                except Exception:
+                    ...
+            self._zf = None
+            self._zf_path = None
 
     def supports_comment(self) -> bool:
         return True
 
     def get_comment(self) -> str:
-        with zipfile.ZipFile(self.path, "r") as zf:
+        with self._reader() as zf:
             encoding = chardet.detect(zf.comment, True)
             if encoding["confidence"] > 60:
                 try:
@@ -37,12 +94,13 @@ class ZipArchiver(Archiver):
         return comment
 
     def set_comment(self, comment: str) -> bool:
+        self._close_zip()
         with zipfile.ZipFile(self.path, mode="a") as zf:
             zf.comment = bytes(comment, "utf-8")
         return True
 
     def read_file(self, archive_file: str) -> bytes:
-        with zipfile.ZipFile(self.path, mode="r") as zf:
+        with self._reader() as zf:
             try:
                 data = zf.read(archive_file)
             except (zipfile.BadZipfile, OSError) as e:
@@ -50,53 +108,90 @@ class ZipArchiver(Archiver):
                 raise
         return data
 
+    def read_file_head(self, archive_file: str, size: int) -> bytes:
+        with self._reader() as zf:
+            try:
+                with zf.open(archive_file) as f:
+                    return f.read(size)
+            except (zipfile.BadZipfile, OSError, KeyError) as e:
+                logger.error("Error reading zip archive [%s]: %s :: %s", e, self.path, archive_file)
+                if isinstance(e, KeyError):
+                    raise OSError(f"{archive_file} not found in {self.path}") from e
+                raise
+
+    def get_file_size(self, archive_file: str) -> int:
+        with self._reader() as zf:
+            try:
+                return zf.getinfo(archive_file).file_size
+            except KeyError as e:
+                raise OSError(f"{archive_file} not found in {self.path}") from e
+
     def remove_file(self, archive_file: str) -> bool:
         return self.rebuild([archive_file])
 
     def write_file(self, archive_file: str, data: bytes) -> bool:
-        # At the moment, no other option but to rebuild the whole
-        # zip archive w/o the indicated file. Very sucky, but maybe
-        # another solution can be found
-        files = self.get_filename_list()
+        return self.write_files({archive_file: data})
+
+    def write_files(self, files: Mapping[str, bytes], comment: str | None = None) -> bool:
+        # Files are always written at the end of the archive.
+        # Replacing a file that is followed only by other non-page files (eg ComicInfo.xml) only moves those files.
+        # Otherwise the archive is rebuilt once without the file so that it ends up at the end of the archive.
+        self._close_zip()
 
         try:
-            # now just add the archive file as a new one
+            with zipfile.ZipFile(self.path, mode="r") as zf:
+                relocate = [f for f in files if f in zf.NameToInfo and not _in_tail(zf, f)]
+            if relocate and not self.rebuild(relocate):
+                return False
+
+            # now just add the archive files as new ones
             with zipfile.ZipFile(self.path, mode="a", allowZip64=True, compression=zipfile.ZIP_DEFLATED) as zf:
                 _patch_zipfile(zf)
-                if archive_file in files:
-                    zf.remove(archive_file)  # type: ignore
-                zf.writestr(archive_file, data)
+                existing = {zf.getinfo(f) for f in files if f in zf.NameToInfo}
+                if existing:
+                    zf._remove_members(existing)  # type: ignore
+                for archive_file, data in files.items():
+                    zf.writestr(archive_file, data)
+                if comment is not None:
+                    zf.comment = bytes(comment, "utf-8")
             return True
         except (zipfile.BadZipfile, OSError) as e:
-            logger.error("Error writing zip archive [%s]: %s :: %s", e, self.path, archive_file)
+            logger.error("Error writing zip archive [%s]: %s :: %s", e, self.path, ", ".join(files))
             return False
 
     def get_filename_list(self) -> list[str]:
         try:
-            with zipfile.ZipFile(self.path, mode="r") as zf:
+            with self._reader() as zf:
                 namelist = [file.filename for file in zf.infolist() if not file.is_dir()]
             return namelist
         except (zipfile.BadZipfile, OSError) as e:
             logger.error("Error listing files in zip archive [%s]: %s", e, self.path)
             return []
 
+    def get_manifest(self) -> list[tuple[str, int, int]]:
+        try:
+            with self._reader() as zf:
+                return [(info.filename, info.file_size, info.CRC) for info in zf.infolist() if not info.is_dir()]
+        except (zipfile.BadZipfile, OSError) as e:
+            logger.error("Error listing files in zip archive [%s]: %s", e, self.path)
+            return []
+
     def supports_files(self) -> bool:
         return True
 
     def rebuild(self, exclude_list: list[str]) -> bool:
         """Zip helper func
 
-        This recompresses the zip archive, without the files in the exclude_list
+        This rebuilds the zip archive without the files in the exclude_list.
+        The remaining files are copied as-is, nothing is decompressed or recompressed.
         """
+        self._close_zip()
         try:
             with zipfile.ZipFile(
                 tempfile.NamedTemporaryFile(dir=os.path.dirname(self.path), delete=False), "w", allowZip64=True
             ) as zout:
                 with zipfile.ZipFile(self.path, mode="r") as zin:
-                    for item in zin.infolist():
-                        buffer = zin.read(item.filename)
-                        if item.filename not in exclude_list:
-                            zout.writestr(item, buffer)
+                    _copy_raw_members(zin, zout, exclude_list)
 
                     # preserve the old comment
                     zout.comment = zin.comment
@@ -114,11 +209,15 @@ class ZipArchiver(Archiver):
 
     def copy_from_archive(self, other_archive: Archiver) -> bool:
         """Replace the current zip with one copied from another archive"""
+        self._close_zip()
         try:
             with zipfile.ZipFile(self.path, mode="w", allowZip64=True) as zout:
-                for filename in other_archive.get_filename_list():
-                    data = other_archive.read_file(filename)
-                    if data is not None:
+                if isinstance(other_archive, ZipArchiver):
+                    # copy the compressed data directly
+                    with zipfile.ZipFile(other_archive.path, mode="r") as zin:
+                        _copy_raw_members(zin, zout, [])
+                else:
+                    for filename, data in other_archive.read_files(other_archive.get_filename_list()):
                         zout.writestr(filename, data)
 
             # preserve the old comment
@@ -141,20 +240,80 @@ class ZipArchiver(Archiver):
     def name(self) -> str:
         return "ZIP"
 
+    def verify(self) -> bool:
+        try:
+            # reads and checks the CRC of every file in the zip
+            with self._reader() as zf:
+                bad_file = zf.testzip()
+            if bad_file is not None:
+                logger.error("Error verifying zip archive: %s :: %s", self.path, bad_file)
+                return False
+            return True
+        except Exception as e:
+            logger.error("Error verifying zip archive [%s]: %s", e, self.path)
+            return False
+
+    @classmethod
+    def sniff(cls, path: pathlib.Path, head: bytes, tail: bytes) -> bool:
+        # the end of central directory record, it can be followed by a comment of up to 64KB
+        return b"PK\x05\x06" in tail
+
     @classmethod
     def is_valid(cls, path: pathlib.Path) -> bool:
-        if not zipfile.is_zipfile(path):  # only checks central directory ot the end of the archive
-            return False
         try:
-            # test all the files in the zip. adds about 0.1 to execution time per zip
+            # only reads the central directory at the end of the archive, see verify for a full check
             with zipfile.ZipFile(path) as zf:
-                for zipinfo in zf.filelist:
-                    zf.open(zipinfo).close()
+                zf.infolist()
             return True
         except Exception:
             return False
 
 
+def _in_tail(zf: zipfile.ZipFile, archive_file: str) -> bool:
+    """Returns True if archive_file is only followed by non-page files"""
+    info = zf.getinfo(archive_file)
+    following = [x.filename for x in zf.infolist() if x.header_offset > info.header_offset and not x.is_dir()]
+    return not utils.get_page_name_list(following)
+
+
+def _copy_raw_members(
+    zin: zipfile.ZipFile, zout: zipfile.ZipFile, exclude_list: list[str], chunk_size: int = 2**20
+) -> None:
+    """Copies the local header and compressed data of every member of zin not in exclude_list to zout.
+    zout must be a newly created ZipFile, the central directory is written by zout when it is closed
+    """
+    assert zin.fp is not None and zout.fp is not None
+    # get a sorted filelist by header offset, in case the dir order
+    # doesn't match the actual entry order
+    filelist = sorted(zin.infolist(), key=lambda x: x.header_offset)
+    for i, info in enumerate(filelist):
+        if info.filename in exclude_list:
+            continue
+
+        # get the total size of the entry, this includes the data descriptor if there is one
+        try:
+            end_offset = filelist[i + 1].header_offset
+        except IndexError:
+            end_offset = zin.start_dir
+
+        new_info = copy.copy(info)
+        new_info.header_offset = zout.fp.tell()
+
+        zin.fp.seek(info.header_offset)
+        remaining = end_offset - info.header_offset
+        while remaining > 0:
+            data = zin.fp.read(min(remaining, chunk_size))
+            if not data:
+                raise zipfile.BadZipFile(f"Unexpected end of file reading {info.filename}")
+            zout.fp.write(data)
+            remaining -= len(data)
+
+        zout.filelist.append(new_info)
+        zout.NameToInfo[new_info.filename] = new_info
+
+    zout.start_dir = zout.fp.tell()
+
+
 def _patch_zipfile(zf):  # type: ignore
     zf.remove = _zip_remove.__get__(zf, zipfile.ZipFile)
     zf._remove_members = _zip_remove_members.__get__(zf, zipfile.ZipFile)
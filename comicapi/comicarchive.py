@@ -15,6 +15,9 @@
 # limitations under the License.
 from __future__ import annotations
 
+import collections
+import concurrent.futures
+import hashlib
 import importlib.util
 import io
 import itertools
@@ -22,21 +25,64 @@ import logging
 import os
 import pathlib
 import shutil
+import stat
 import sys
-from collections.abc import Iterable
+from collections.abc import Generator, Iterable, Iterator
+from enum import auto
+from typing import Callable, TypeVar
 
-from comicapi import utils
+from comicapi import imagesize, utils
 from comicapi.archivers import Archiver, UnknownArchiver, ZipArchiver
-from comicapi.genericmetadata import GenericMetadata
+from comicapi.genericmetadata import GenericMetadata, PageMetadata
+from comicapi.libraryindex import IndexEntry, LibraryIndex
 from comicapi.tags import Tag
 from comictaggerlib.ctversion import version
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 archivers: list[type[Archiver]] = []
 tags: dict[str, Tag] = {}
 
 
+def _bounded_map(func: Callable[[T], R], items: Iterable[T], workers: int) -> Iterator[R]:
+    """Like Executor.map but only workers * 2 items are submitted ahead of the result being yielded"""
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="page") as pool:
+        remaining = iter(items)
+        window = collections.deque(pool.submit(func, item) for item in itertools.islice(remaining, workers * 2))
+        while window:
+            future = window.popleft()
+            for item in itertools.islice(remaining, 1):
+                window.append(pool.submit(func, item))
+            yield future.result()
+
+
+def read_signature(path: pathlib.Path, head_size: int = 4096, tail_size: int = 65557) -> tuple[bytes, bytes]:
+    """
+    Returns the first head_size and last tail_size bytes of path for Archiver.sniff.
+    The default tail_size covers a zip end of central directory record with the largest possible comment.
+    Both are empty if path is a directory or cannot be read.
+    """
+    if path.is_dir():
+        return b"", b""
+    try:
+        with path.open("rb") as f:
+            head = f.read(head_size)
+            size = f.seek(0, os.SEEK_END)
+            if size <= head_size:
+                return head, head
+            f.seek(max(size - tail_size, 0))
+            return head, f.read(tail_size)
+    except OSError:
+        return b"", b""
+
+
 def load_archive_plugins(local_plugins: Iterable[type[Archiver]] = tuple()) -> None:
     if archivers:
         return
@@ -119,9 +165,77 @@ def load_tag_plugins(version: str = f"ComicAPI/{version}", local_plugins: Iterab
     tags.update({s[0]: s[1][0] for s in tag_plugins.items()})
 
 
+class _PendingWrites(Archiver):
+    """Wraps an archiver and collects the files and comment written to it so they can be written in one operation"""
+
+    def __init__(self, archiver: Archiver) -> None:
+        self.archiver = archiver
+        self.path = archiver.path
+        self.files: dict[str, bytes] = {}
+        self.comment: str | None = None
+
+    def get_comment(self) -> str:
+        if self.comment is not None:
+            return self.comment
+        return self.archiver.get_comment()
+
+    def set_comment(self, comment: str) -> bool:
+        if not self.archiver.supports_comment():
+            return False
+        self.comment = comment
+        return True
+
+    def supports_comment(self) -> bool:
+        return self.archiver.supports_comment()
+
+    def read_file(self, archive_file: str) -> bytes:
+        if archive_file in self.files:
+            return self.files[archive_file]
+        return self.archiver.read_file(archive_file)
+
+    def remove_file(self, archive_file: str) -> bool:
+        self.files.pop(archive_file, None)
+        return self.archiver.remove_file(archive_file)
+
+    def write_file(self, archive_file: str, data: bytes) -> bool:
+        self.files[archive_file] = data
+        return True
+
+    def get_filename_list(self) -> list[str]:
+        filenames = self.archiver.get_filename_list()
+        return filenames + [f for f in self.files if f not in filenames]
+
+    def supports_files(self) -> bool:
+        return self.archiver.supports_files()
+
+    def is_writable(self) -> bool:
+        return self.archiver.is_writable()
+
+    def extension(self) -> str:
+        return self.archiver.extension()
+
+    def name(self) -> str:
+        return self.archiver.name()
+
+    def commit(self) -> bool:
+        if not self.files and self.comment is None:
+            return True
+        return self.archiver.write_files(self.files, self.comment)
+
+
+class Validation(utils.StrEnum):
+    """How thoroughly an archive is checked before it is considered a comic archive"""
+
+    QUICK = auto()  # Only what is needed to open the archive eg the zip central directory
+    FULL = auto()  # Every file is read and its integrity checked
+
+
 class ComicArchive:
     logo_data = b""
     pil_available = True
+    validation = Validation.QUICK
+    page_workers = 4
+    library_index: LibraryIndex | None = None
 
     def __init__(
         self, path: pathlib.Path | str | Archiver, default_image_path: pathlib.Path | str | None = None
@@ -129,6 +243,10 @@ class ComicArchive:
         self.md: dict[str, GenericMetadata] = {}
         self.page_count: int | None = None
         self.page_list: list[str] = []
+        self._verified: bool | None = None
+        self._fingerprint: str | None = None
+        # True when the archive was found unchanged in the library index
+        self._indexed = False
 
         self.reset_cache()
         self.default_image_path = default_image_path
@@ -142,32 +260,123 @@ class ComicArchive:
 
         load_archive_plugins()
         load_tag_plugins()
-        for archiver in archivers:
-            if archiver.enabled and archiver.is_valid(self.path):
-                self.archiver = archiver.open(self.path)
-                break
+        entry = None
+        if self.library_index is not None and not isinstance(path, Archiver):
+            entry = self.library_index.get(self.path)
+
+        if entry is None or not self._open_from_index(entry):
+            head, tail = read_signature(self.path)
+            for archiver in archivers:
+                if archiver.enabled and archiver.sniff(self.path, head, tail) and archiver.is_valid(self.path):
+                    self.archiver = archiver.open(self.path)
+                    break
+            if entry is not None:
+                self._check_index(entry)
 
         if not ComicArchive.logo_data and self.default_image_path:
             with open(self.default_image_path, mode="rb") as fd:
                 ComicArchive.logo_data = fd.read()
 
+    def _open_from_index(self, entry: IndexEntry) -> bool:
+        """Uses the library index entry without opening the archive if the inode, size and mtime are unchanged"""
+        try:
+            st = self.path.stat()
+        except OSError:
+            return False
+        # The mtime of a folder does not change when a file in a sub-folder does
+        if not stat.S_ISREG(st.st_mode) or (st.st_ino, st.st_size, st.st_mtime_ns) != entry[:3]:
+            return False
+        for archiver in archivers:
+            if archiver.enabled:
+                candidate = archiver.open(self.path)
+                if candidate.name() == entry.archiver:
+                    self.archiver = candidate
+                    self._apply_index(entry)
+                    return True
+        return False
+
+    def _check_index(self, entry: IndexEntry) -> None:
+        """Keeps an entry whose inode, size or mtime changed if the contents of the archive are the same"""
+        assert self.library_index is not None
+        if self.archiver.name() != entry.archiver or self.fingerprint() != entry.fingerprint:
+            self.library_index.remove(self.path)
+            return
+        st = self.path.stat()
+        self.library_index.touch(self.path, st.st_ino, st.st_size, st.st_mtime_ns)
+        self._apply_index(entry)
+
+    def _apply_index(self, entry: IndexEntry) -> None:
+        self.page_list = list(entry.page_list)
+        self.md.update(entry.tags)
+        self._fingerprint = entry.fingerprint
+        self._indexed = True
+
+    def _update_index(self, previous_fingerprint: str | None = None) -> None:
+        if self.library_index is None or isinstance(self.archiver, UnknownArchiver):
+            return
+        try:
+            st = self.path.stat()
+            entry = IndexEntry(
+                inode=st.st_ino,
+                size=st.st_size,
+                mtime_ns=st.st_mtime_ns,
+                fingerprint=self.fingerprint(),
+                archiver=self.archiver.name(),
+                page_list=self.get_page_name_list(),
+                tags={tag_id: md for tag_id, md in self.md.items() if tag_id in tags and tags[tag_id].enabled},
+            )
+            self.library_index.put(self.path, entry, previous_fingerprint)
+        except Exception as e:
+            logger.debug("Failed to update the library index for %s: %s", self.path, e)
+
+    def __enter__(self) -> ComicArchive:
+        self.open_session()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close_session()
+
+    def open_session(self) -> None:
+        """Allows the archiver to keep the archive open between reads until close_session is called"""
+        self.archiver.open_session()
+
+    def close_session(self) -> None:
+        self.archiver.close_session()
+
     def reset_cache(self) -> None:
         """Clears the cached data"""
 
         self.page_count = None
         self.page_list.clear()
         self.md.clear()
+        self._verified = None
+        self._fingerprint = None
+        self._indexed = False
 
     def load_cache(self, tag_ids: Iterable[str]) -> None:
-        for tag_id in tag_ids:
-            if tag_id not in tags:
-                continue
+        """Reads the given tags, the library index is updated once for all of them"""
+        loaded = [tag_id for tag_id in tag_ids if tag_id in tags and tag_id not in self.md]
+        for tag_id in loaded:
+            self._load_tags(tag_id, update_index=False)
+        if loaded:
+            self._update_index()
+
+    def _load_tags(self, tag_id: str, update_index: bool = True) -> GenericMetadata:
+        """
+        Reads and parses the given tags once, the result is cached in self.md until the tags are written or removed.
+        Tags that are not in the archive are cached as an empty GenericMetadata.
+        """
+        if tag_id not in self.md:
+            md = GenericMetadata()
             tag = tags[tag_id]
-            if not tag.enabled:
-                continue
-            md = tag.read_tags(self.archiver)
-            if not md.is_empty:
-                self.md[tag_id] = md
+            if tag.enabled:
+                md = tag.read_tags(self.archiver)
+                if not md.is_empty:
+                    md.apply_default_page_list(self.get_page_name_list())
+            self.md[tag_id] = md
+            if update_index:
+                self._update_index()
+        return self.md[tag_id]
 
     def get_supported_tags(self) -> list[str]:
         return [tag_id for tag_id, tag in tags.items() if tag.enabled and tag.supports_tags(self.archiver)]
@@ -178,6 +387,8 @@ class ComicArchive:
             return
         os.makedirs(new_path.parent, 0o777, True)
         shutil.move(self.path, new_path)
+        if self.library_index is not None:
+            self.library_index.rename(self.path, new_path)
         self.path = new_path
         self.archiver.path = pathlib.Path(path)
 
@@ -200,52 +411,90 @@ class ComicArchive:
         if (
             not (isinstance(self.archiver, UnknownArchiver))
             and self.get_number_of_pages() > 0
-            and self.archiver.is_valid(self.path)
+            and (self._indexed or self.archiver.is_valid(self.path))
+            and (self.validation != Validation.FULL or self.verify())
         ):
             return True
 
         return False
 
+    def verify(self) -> bool:
+        """Checks the integrity of every file in the archive, the result is cached until the archive is written to"""
+        if self._verified is None:
+            self._verified = self.archiver.verify()
+        return self._verified
+
+    def fingerprint(self) -> str:
+        """
+        Returns a hash of the archive size and its directory (the names, sizes and checksums of every file).
+        No page data is read and it does not change when the archive is renamed or moved,
+        any change to the contents including writing tags changes it.
+        The result is cached until the archive is written to.
+        """
+        if self._fingerprint is None:
+            h = hashlib.sha256(self.archiver.name().encode("utf-8"))
+            if self.path.is_file():
+                h.update(str(self.path.stat().st_size).encode("utf-8"))
+            for filename, size, checksum in sorted(self.archiver.get_manifest()):
+                h.update(f"\0{filename}\0{size}\0{checksum}".encode("utf-8", errors="surrogateescape"))
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
     def extension(self) -> str:
         return self.archiver.extension()
 
     def read_tags(self, tag_id: str) -> GenericMetadata:
-        if tag_id in self.md:
-            return self.md[tag_id]
-        md = GenericMetadata()
-        tag = tags[tag_id]
-        if tag.enabled and tag.has_tags(self.archiver):
-            md = tag.read_tags(self.archiver)
-            md.apply_default_page_list(self.get_page_name_list())
-        return md
+        """Returns a copy of the cached tags so that the cache is not modified by the caller"""
+        return self._load_tags(tag_id).copy()
 
     def read_raw_tags(self, tag_id: str) -> str:
         if not tags[tag_id].enabled:
             return ""
         return tags[tag_id].read_raw_tags(self.archiver)
 
-    def write_tags(self, metadata: GenericMetadata, tag_id: str) -> bool:
-        if tag_id in self.md:
-            del self.md[tag_id]
-        if not tags[tag_id].enabled:
+    def write_tags(self, metadata: GenericMetadata, tag_id: str | Iterable[str]) -> bool:
+        """Writes metadata as the given tags, multiple tags are written to the archive in one operation"""
+        tag_ids = [tag_id] if isinstance(tag_id, str) else list(tag_id)
+        previous_fingerprint = self._fingerprint
+        self._verified = None
+        self._fingerprint = None
+        for t_id in tag_ids:
+            self.md.pop(t_id, None)
+        if not all(tags[t_id].enabled for t_id in tag_ids):
             return False
 
         self.apply_archive_info_to_metadata(metadata, True, True)
-        return tags[tag_id].write_tags(metadata, self.archiver)
+        pending = _PendingWrites(self.archiver)
+        for t_id in tag_ids:
+            if not tags[t_id].write_tags(metadata, pending):
+                return False
+        if not pending.commit():
+            return False
+        self._reindex(tag_ids, previous_fingerprint)
+        return True
 
     def has_tags(self, tag_id: str) -> bool:
-        if tag_id in self.md:
-            return True
-        if not tags[tag_id].enabled:
-            return False
-        return tags[tag_id].has_tags(self.archiver)
+        return not self._load_tags(tag_id).is_empty
 
     def remove_tags(self, tag_id: str) -> bool:
-        if tag_id in self.md:
-            del self.md[tag_id]
+        previous_fingerprint = self._fingerprint
+        self._verified = None
+        self._fingerprint = None
+        self.md.pop(tag_id, None)
         if not tags[tag_id].enabled:
             return False
-        return tags[tag_id].remove_tags(self.archiver)
+        if not tags[tag_id].remove_tags(self.archiver):
+            return False
+        self._reindex([tag_id], previous_fingerprint)
+        return True
+
+    def _reindex(self, tag_ids: list[str], previous_fingerprint: str | None) -> None:
+        """Reads the written tags back so that the library index matches the archive, the other tags are kept"""
+        if self.library_index is None:
+            return
+        for t_id in tag_ids:
+            self._load_tags(t_id, update_index=False)
+        self._update_index(previous_fingerprint)
 
     def get_page(self, index: int) -> bytes:
         image_data = b""
@@ -261,6 +510,72 @@ class ComicArchive:
 
         return image_data
 
+    def get_pages(self, indices: Iterable[int]) -> Generator[tuple[int, bytes], None, None]:
+        """
+        Reads the given pages from the archive in one pass, yielding (index, data) tuples.
+        Pages are yielded in the order the archiver reads them, not necessarily the order given.
+        """
+        names: dict[str, list[int]] = {}
+        for index in indices:
+            names.setdefault(self.get_page_name(index), []).append(index)
+        empty = names.pop("", [])
+
+        try:
+            for filename, data in self.archiver.read_files(list(names)):
+                for index in names.pop(filename, []):
+                    yield index, data or b""
+        except Exception:
+            logger.exception("Error reading in pages from %s", self.path)
+
+        # Anything left failed to read in bulk, get_page will substitute the logo if it still fails
+        for page_indices in names.values():
+            for index in page_indices:
+                yield index, self.get_page(index)
+        for index in empty:
+            yield index, b""
+
+    def iter_pages(self, indices: Iterable[int], workers: int = 4) -> Iterator[tuple[int, bytes]]:
+        """
+        Yields (index, data) tuples for the given pages in the order given.
+        If the archiver has a bulk read it is used, otherwise pages are read ahead by a pool of workers threads.
+        At most workers * 2 pages are read ahead of the page being yielded.
+        """
+        indices = list(indices)
+        if type(self.archiver).read_files is not Archiver.read_files:
+            yield from self._iter_pages_bulk(indices, max(2, workers * 2))
+            return
+
+        with self:
+            yield from _bounded_map(lambda index: (index, self.get_page(index)), indices, workers)
+
+    def _iter_pages_bulk(self, indices: list[int], limit: int) -> Iterator[tuple[int, bytes]]:
+        """
+        The bulk read yields pages in archive order, pages are held until it is their turn.
+        At most limit pages are held, the ones needed soonest are kept and the rest are read again
+        by another bulk read once the held pages have been yielded.
+        """
+        position = 0
+        held: dict[int, bytes] = {}  # position in indices -> data
+        while position < len(indices):
+            positions: dict[int, collections.deque[int]] = {}
+            missing = []
+            for pos in range(position, len(indices)):
+                if pos not in held:
+                    positions.setdefault(indices[pos], collections.deque()).append(pos)
+                    missing.append(indices[pos])
+
+            pages = self.get_pages(missing)
+            try:
+                for index, data in pages:
+                    held[positions[index].popleft()] = data
+                    while position in held:
+                        yield indices[position], held.pop(position)
+                        position += 1
+                    if len(held) > limit:
+                        del held[max(held)]
+            finally:
+                pages.close()
+
     def get_page_name(self, index: int) -> str:
         if index is None:
             return ""
@@ -333,46 +648,95 @@ class ComicArchive:
         return self.page_count
 
     def apply_archive_info_to_metadata(
-        self, md: GenericMetadata, calc_page_sizes: bool = False, detect_double_page: bool = False
+        self,
+        md: GenericMetadata,
+        calc_page_sizes: bool = False,
+        detect_double_page: bool = False,
+        progress_callback: Callable[[int, int], None] | None = None,
     ) -> None:
+        """
+        Sets the page count and page list of md from the archive.
+        If calc_page_sizes is True the size and dimensions of pages that do not have them are read
+        using page_workers threads. progress_callback is called with (pages done, total pages).
+        """
         md.page_count = self.get_number_of_pages()
         md.apply_default_page_list(self.get_page_name_list())
         if not calc_page_sizes or not self.seems_to_be_a_comic_archive():
             return
+        with self:
+            self._calc_page_sizes(md, detect_double_page, progress_callback)
+
+    def _calc_page_sizes(
+        self,
+        md: GenericMetadata,
+        detect_double_page: bool,
+        progress_callback: Callable[[int, int], None] | None = None,
+    ) -> None:
+        pages: dict[int, list[PageMetadata]] = {}
         for p in md.pages:
+            if p.byte_size is None or p.height is None or p.width is None or p.double_page is None:
+                pages.setdefault(p.archive_index, []).append(p)
+
+        for done, (index, byte_size, size) in enumerate(self._page_sizes(pages), 1):
+            for p in pages[index]:
+                p.byte_size = byte_size
+                if size is None:
+                    continue
+                p.width, p.height = size
+                if detect_double_page:
+                    p.double_page = p.is_double_page()
+            if progress_callback is not None:
+                progress_callback(done, len(pages))
+
+    def _page_sizes(self, indices: Iterable[int]) -> Iterator[tuple[int, int, tuple[int, int] | None]]:
+        """
+        Yields (index, byte size, (width, height)) for the given pages in no particular order.
+        The dimensions are read from the image header when the archiver can read part of a file,
+        pages that cannot be probed are read completely. Archives that are read in bulk are read in one pass
+        and only the image decoding is done in parallel.
+        """
+        if type(self.archiver).read_files is Archiver.read_files:
+            yield from _bounded_map(self._page_size, indices, self.page_workers)
+        else:
+            yield from _bounded_map(
+                lambda page: (page[0], len(page[1]), self._decode_size(*page)),
+                self.get_pages(indices),
+                self.page_workers,
+            )
 
-            if not self.pil_available:
-                if p.byte_size is not None:
-                    data = self.get_page(p.archive_index)
-                    p.byte_size = len(data)
-                continue
-            try:
-                from PIL import Image
+    def _page_size(self, index: int) -> tuple[int, int, tuple[int, int] | None]:
+        filename = self.get_page_name(index)
+        if not filename:
+            return index, 0, None
+        try:
+            size = imagesize.get_image_size(self.archiver.read_file_head(filename, imagesize.probe_size))
+            if size is not None:
+                return index, self.archiver.get_file_size(filename), size
+        except Exception as e:
+            logger.debug("Unable to probe image size [%s] %s :: image %s", e, self.path, index)
 
-                self.pil_available = True
-            except ImportError:
-                self.pil_available = False
-                if p.byte_size is not None:
-                    data = self.get_page(p.archive_index)
-                    p.byte_size = len(data)
-                continue
+        data = self.get_page(index)
+        return index, len(data), self._decode_size(index, data)
 
-            if p.byte_size is None or p.height is None or p.width is None or p.double_page is None:
-                try:
-                    data = self.get_page(p.archive_index)
-                    p.byte_size = len(data)
-                    if not data:
-                        continue
-
-                    im = Image.open(io.BytesIO(data))
-                    w, h = im.size
-
-                    p.height = h
-                    p.width = w
-                    if detect_double_page:
-                        p.double_page = p.is_double_page()
-                except Exception as e:
-                    logger.exception("Error decoding image [%s] %s :: image %s", e, self.path, p.archive_index)
+    def _decode_size(self, index: int, data: bytes) -> tuple[int, int] | None:
+        if not data:
+            return None
+        size = imagesize.get_image_size(data)
+        if size is not None or not self.pil_available:
+            return size
+        try:
+            from PIL import Image
+
+            self.pil_available = True
+        except ImportError:
+            self.pil_available = False
+            return None
+        try:
+            im = Image.open(io.BytesIO(data))
+            return im.size
+        except Exception as e:
+            logger.exception("Error decoding image [%s] %s :: image %s", e, self.path, index)
+        return None
 
     def metadata_from_filename(
         self,
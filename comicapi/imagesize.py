@@ -0,0 +1,141 @@
+"""Reads the dimensions of an image from the start of the file without decoding it"""
+
+#
+# Copyright 2012-2014 ComicTagger Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Enough for the image headers of any format handled here, unless a JPEG has large metadata before the frame header
+probe_size = 64 * 1024
+
+# Start of frame markers, C4 (DHT), C8 (JPG) and CC (DAC) share the range but are not frame headers
+_jpeg_sof = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def get_image_size(data: bytes) -> tuple[int, int] | None:
+    """
+    Returns the (width, height) of the image that data starts with.
+    Returns None if the format is not recognised or the header is not completely contained in data.
+    Supports JPEG, PNG, GIF, WebP, BMP and AVIF/HEIF.
+    """
+    try:
+        if data.startswith(b"\xff\xd8"):
+            return _jpeg_size(data)
+        if data.startswith(b"\x89PNG\r\n\x1a\n") and data[12:16] == b"IHDR":
+            return struct.unpack(">II", data[16:24])
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", data[6:10])
+        if data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+            return _webp_size(data)
+        if data.startswith(b"BM"):
+            return _bmp_size(data)
+        if data[4:8] == b"ftyp":
+            return _heif_size(data)
+    except struct.error:
+        # the header was cut off
+        return None
+    return None
+
+
+def _jpeg_size(data: bytes) -> tuple[int, int] | None:
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # markers without a length
+            i += 2
+            continue
+        if marker == 0xD9:
+            return None
+        (length,) = struct.unpack(">H", data[i + 2 : i + 4])
+        if marker in _jpeg_sof:
+            height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def _webp_size(data: bytes) -> tuple[int, int] | None:
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", data[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _bmp_size(data: bytes) -> tuple[int, int] | None:
+    (header_size,) = struct.unpack("<I", data[14:18])
+    if header_size == 12:
+        return struct.unpack("<HH", data[18:22])
+    width, height = struct.unpack("<ii", data[18:26])
+    return width, abs(height)
+
+
+def _boxes(data: bytes, start: int, end: int) -> list[tuple[bytes, int, int]]:
+    """Returns the (type, start of content, end) of the ISOBMFF boxes between start and end"""
+    boxes = []
+    i = start
+    while i + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[i : i + 8])
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", data[i + 8 : i + 16])
+            header = 16
+        elif size == 0:
+            size = end - i
+        if size < header:
+            break
+        boxes.append((box_type, i + header, min(i + size, end)))
+        i += size
+    return boxes
+
+
+def _heif_size(data: bytes) -> tuple[int, int] | None:
+    # The image spatial extents (ispe) properties are in meta -> iprp -> ipco.
+    # A grid image has an ispe for every tile as well as the full image, the largest is the full image
+    sizes: list[tuple[int, int]] = []
+    for box_type, start, end in _boxes(data, 0, len(data)):
+        if box_type != b"meta":
+            continue
+        # meta is a full box, skip the version and flags
+        for iprp_type, iprp_start, iprp_end in _boxes(data, start + 4, end):
+            if iprp_type != b"iprp":
+                continue
+            for ipco_type, ipco_start, ipco_end in _boxes(data, iprp_start, iprp_end):
+                if ipco_type != b"ipco":
+                    continue
+                for prop_type, prop_start, prop_end in _boxes(data, ipco_start, ipco_end):
+                    if prop_type == b"ispe" and prop_start + 12 <= prop_end:
+                        sizes.append(struct.unpack(">II", data[prop_start + 4 : prop_start + 12]))
+    if not sizes:
+        return None
+    return max(sizes, key=lambda size: size[0] * size[1])
@@ -0,0 +1,486 @@
+"""A SQLite index of comic archives, their pages and tags so that unchanged archives do not need to be opened"""
+
+# Copyright 2012-2014 ComicTagger Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import re
+import shlex
+import sqlite3
+import threading
+from typing import Any, NamedTuple
+
+from comicapi import merge
+from comicapi._url import parse_url
+from comicapi.genericmetadata import GenericMetadata, MetadataOrigin, PageMetadata
+from comictaggerlib.ctversion import version
+
+logger = logging.getLogger(__name__)
+
+# The tag fields copied into the TagFields table for LibraryIndex.query and their column types.
+# Lists and sets are stored one item per line, credits are stored as the names of the people
+query_fields = {
+    "series": "TEXT",
+    "issue": "TEXT",
+    "issue_count": "INTEGER",
+    "title": "TEXT",
+    "volume": "INTEGER",
+    "publisher": "TEXT",
+    "imprint": "TEXT",
+    "year": "INTEGER",
+    "month": "INTEGER",
+    "day": "INTEGER",
+    "language": "TEXT",
+    "country": "TEXT",
+    "format": "TEXT",
+    "maturity_rating": "TEXT",
+    "critical_rating": "REAL",
+    "page_count": "INTEGER",
+    "data_origin": "TEXT",
+    "issue_id": "TEXT",
+    "series_id": "TEXT",
+    "genres": "TEXT",
+    "story_arcs": "TEXT",
+    "series_groups": "TEXT",
+    "characters": "TEXT",
+    "teams": "TEXT",
+    "locations": "TEXT",
+    "tags": "TEXT",
+    "credits": "TEXT",
+    "scan_info": "TEXT",
+}
+
+_query_term = re.compile(r"(?P<field>\w+)(?P<op>>=|<=|!=|[:=<>])(?P<value>.*)", re.DOTALL)
+
+
+class QueryTerm(NamedTuple):
+    field: str
+    op: str
+    value: str
+
+
+def parse_query(query: str) -> list[QueryTerm]:
+    """
+    Parses a query of space separated terms that must all match eg 'series:batman year>=1990 missing:cr'.
+    Values with spaces can be quoted eg 'series:"amazing spider-man"'.
+
+    field:value matches text fields containing value and numeric fields equal to value
+    field=value, field!=value, field<value, field<=value, field>value and field>=value compare the whole value
+    tag:id limits the field terms to the given tags
+    has:id and missing:id match archives with and without the given tags
+
+    Raises ValueError for an invalid term.
+    """
+    terms = []
+    for word in shlex.split(query):
+        match = _query_term.fullmatch(word)
+        if match is None:
+            raise ValueError(f"Invalid query term: {word!r}")
+        term = QueryTerm(match["field"].casefold(), match["op"], match["value"])
+        if term.field in ("tag", "has", "missing"):
+            if term.op != ":":
+                raise ValueError(f"Invalid query term: {word!r}, use {term.field}:<tag id>")
+            term = term._replace(value=term.value.casefold())
+        elif term.field not in query_fields:
+            raise ValueError(f"Unknown field {term.field!r} in query, valid fields are: {', '.join(query_fields)}")
+        elif query_fields[term.field] != "TEXT" and term.op != "!=":
+            try:
+                float(term.value)
+            except ValueError:
+                raise ValueError(f"{term.field} must be a number: {word!r}") from None
+        terms.append(term)
+    return terms
+
+
+def _field_value(md: GenericMetadata, field: str) -> Any:
+    value = getattr(md, field)
+    if field == "credits":
+        value = [credit.person for credit in value]
+    elif field == "data_origin" and value is not None:
+        value = value.name
+    if isinstance(value, (list, set)):
+        value = "\n".join(sorted(str(x) for x in value))
+    if value == "":
+        return None
+    return value
+
+
+def _md_to_json(md: GenericMetadata) -> dict[str, Any]:
+    data: dict[str, Any] = {}
+    for field in dataclasses.fields(md):
+        value = getattr(md, field.name)
+        if field.name == "data_origin" and value is not None:
+            value = list(value)
+        elif field.name == "web_links":
+            value = [str(url) for url in value]
+        elif field.name in ("pages", "credits"):
+            value = [dataclasses.asdict(x) for x in value]
+        elif isinstance(value, set):
+            value = sorted(value)
+        data[field.name] = value
+    return data
+
+
+def _md_from_json(data: dict[str, Any]) -> GenericMetadata:
+    """Fields that GenericMetadata no longer has are ignored"""
+    md = GenericMetadata()
+    for field in dataclasses.fields(md):
+        if field.name not in data:
+            continue
+        value = data[field.name]
+        if field.name == "data_origin" and value is not None:
+            value = MetadataOrigin(*value)
+        elif field.name == "web_links":
+            value = [parse_url(url) for url in value]
+        elif field.name == "pages":
+            value = [PageMetadata(**page) for page in value]
+        elif field.name == "credits":
+            value = [merge.Credit(**credit) for credit in value]
+        elif isinstance(getattr(md, field.name), set):
+            value = set(value)
+        setattr(md, field.name, value)
+    return md
+
+
+def _tags_to_json(tags: dict[str, GenericMetadata]) -> str:
+    return json.dumps({tag_id: _md_to_json(md) for tag_id, md in tags.items()})
+
+
+def _tags_from_json(data: str) -> dict[str, GenericMetadata]:
+    return {tag_id: _md_from_json(md) for tag_id, md in json.loads(data).items()}
+
+
+class IndexEntry(NamedTuple):
+    inode: int
+    size: int
+    mtime_ns: int
+    fingerprint: str
+    archiver: str
+    page_list: list[str]
+    tags: dict[str, GenericMetadata]
+
+
+class LibraryIndex:
+    """
+    Stores what was read from an archive, keyed by the absolute path of the archive.
+    An entry is only current while the inode, size and mtime of the archive match, ComicArchive.fingerprint is
+    stored so that an archive that was touched or copied without changing its contents can still be matched.
+
+    Tags are stored as JSON, the index is dropped whenever the version changes.
+    What the watcher has processed does not depend on how the tags are read and is kept across versions.
+    The database is only opened when it is first used, a single connection is shared between threads.
+    """
+
+    # Increment when the tables change, the index is dropped when this or the version changes
+    schema = 6
+    # Increment when the Watched table changes, it is only dropped when this changes
+    watched_schema = 1
+
+    def __init__(self, db_file: pathlib.Path, version: str = version) -> None:
+        self.db_file = db_file
+        self.version = version
+        self._con: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._con is None:
+            self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(self.db_file, check_same_thread=False)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            with con:
+                self.create_index_db(con)
+            self._con = con
+        return self._con
+
+    def create_index_db(self, con: sqlite3.Connection) -> None:
+        con.execute("CREATE TABLE IF NOT EXISTS Info(key TEXT NOT NULL, value TEXT, PRIMARY KEY (key))")
+        info = {row["key"]: row["value"] for row in con.execute("SELECT * FROM Info")}
+        if info.get("version") != self.version or info.get("schema") != str(self.schema):
+            # A different version may read the tags differently
+            con.execute("DROP TABLE IF EXISTS Archives")
+            con.execute("DROP TABLE IF EXISTS Covers")
+            con.execute("DROP TABLE IF EXISTS TagFields")
+            con.execute("DROP TABLE IF EXISTS Invalid")
+            con.execute("INSERT OR REPLACE INTO Info (key, value) VALUES ('version', ?)", [self.version])
+            con.execute("INSERT OR REPLACE INTO Info (key, value) VALUES ('schema', ?)", [str(self.schema)])
+        if info.get("watched_schema") != str(self.watched_schema):
+            con.execute("DROP TABLE IF EXISTS Watched")
+            con.execute(
+                "INSERT OR REPLACE INTO Info (key, value) VALUES ('watched_schema', ?)", [str(self.watched_schema)]
+            )
+
+        con.execute(
+            """CREATE TABLE IF NOT EXISTS Archives(
+            timestamp   DATE DEFAULT (datetime('now','localtime')),
+            path        TEXT NOT NULL,
+            inode       INTEGER NOT NULL,
+            size        INTEGER NOT NULL,
+            mtime_ns    INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            archiver    TEXT NOT NULL,
+            page_list   TEXT NOT NULL,
+            tags        TEXT,
+            PRIMARY KEY (path))"""
+        )
+        columns = "".join(f",\n            {field} {column_type}" for field, column_type in query_fields.items())
+        con.execute(
+            f"""CREATE TABLE IF NOT EXISTS TagFields(
+            path        TEXT NOT NULL,
+            tag_id      TEXT NOT NULL{columns},
+            PRIMARY KEY (path, tag_id))"""
+        )
+        con.execute(
+            """CREATE TABLE IF NOT EXISTS Invalid(
+            timestamp   DATE DEFAULT (datetime('now','localtime')),
+            path        TEXT NOT NULL,
+            inode       INTEGER NOT NULL,
+            size        INTEGER NOT NULL,
+            mtime_ns    INTEGER NOT NULL,
+            PRIMARY KEY (path))"""
+        )
+        con.execute(
+            """CREATE TABLE IF NOT EXISTS Watched(
+            timestamp   DATE DEFAULT (datetime('now','localtime')),
+            path        TEXT NOT NULL,
+            action      TEXT NOT NULL,
+            inode       INTEGER NOT NULL,
+            size        INTEGER NOT NULL,
+            mtime_ns    INTEGER NOT NULL,
+            status      TEXT,
+            PRIMARY KEY (path, action))"""
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+    def clear_index(self) -> None:
+        with self._lock:
+            self.close()
+            for suffix in ("", "-wal", "-shm"):
+                pathlib.Path(str(self.db_file) + suffix).unlink(missing_ok=True)
+
+    def get(self, path: pathlib.Path) -> IndexEntry | None:
+        """Returns the entry for path whether or not it is current, the caller is expected to check it"""
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM Archives WHERE path = ?", [str(path)]).fetchone()
+        if row is None:
+            return None
+        try:
+            return IndexEntry(
+                inode=row["inode"],
+                size=row["size"],
+                mtime_ns=row["mtime_ns"],
+                fingerprint=row["fingerprint"],
+                archiver=row["archiver"],
+                page_list=json.loads(row["page_list"]),
+                tags=_tags_from_json(row["tags"]),
+            )
+        except Exception as e:
+            logger.debug("Discarding unreadable index entry for %s: %s", path, e)
+            self.remove(path)
+            return None
+
+    def put(self, path: pathlib.Path, entry: IndexEntry, previous_fingerprint: str | None = None) -> None:
+        """
+        Stores entry for path. entry.tags only needs the tags that were read, the stored tags of any other tag ids
+        are kept if the stored entry has the same fingerprint or previous_fingerprint eg before the archive was written.
+        """
+        with self._lock:
+            con = self._connect()
+            with con:
+                tags = entry.tags
+                row = con.execute("SELECT fingerprint, tags FROM Archives WHERE path = ?", [str(path)]).fetchone()
+                merge = row is not None and row["fingerprint"] in (entry.fingerprint, previous_fingerprint)
+                if merge:
+                    try:
+                        tags = {**_tags_from_json(row["tags"]), **entry.tags}
+                    except Exception as e:
+                        logger.debug("Discarding unreadable index tags for %s: %s", path, e)
+                        merge = False
+                con.execute(
+                    """INSERT OR REPLACE INTO Archives
+                    (path, inode, size, mtime_ns, fingerprint, archiver, page_list, tags)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (
+                        str(path),
+                        entry.inode,
+                        entry.size,
+                        entry.mtime_ns,
+                        entry.fingerprint,
+                        entry.archiver,
+                        json.dumps(entry.page_list),
+                        _tags_to_json(tags),
+                    ),
+                )
+                if merge:
+                    con.executemany(
+                        "DELETE FROM TagFields WHERE path = ? AND tag_id = ?",
+                        [(str(path), tag_id) for tag_id in entry.tags],
+                    )
+                else:
+                    con.execute("DELETE FROM TagFields WHERE path = ?", [str(path)])
+                columns = ", ".join(query_fields)
+                slots = ", ".join("?" * (len(query_fields) + 2))
+                con.executemany(
+                    f"INSERT INTO TagFields (path, tag_id, {columns}) VALUES ({slots})",
+                    [
+                        (str(path), tag_id, *(_field_value(md, field) for field in query_fields))
+                        for tag_id, md in entry.tags.items()
+                        if not md.is_empty
+                    ],
+                )
+                con.execute("DELETE FROM Invalid WHERE path = ?", [str(path)])
+
+    def set_invalid(self, path: pathlib.Path, inode: int, size: int, mtime_ns: int) -> None:
+        """Records that path is not a comic archive so that it is not opened again until it changes"""
+        with self._lock:
+            con = self._connect()
+            with con:
+                for table in ("Archives", "TagFields"):
+                    con.execute(f"DELETE FROM {table} WHERE path = ?", [str(path)])
+                con.execute(
+                    "INSERT OR REPLACE INTO Invalid (path, inode, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                    (str(path), inode, size, mtime_ns),
+                )
+
+    def touch(self, path: pathlib.Path, inode: int, size: int, mtime_ns: int) -> None:
+        """Updates the inode, size and mtime of an entry whose contents were found to be unchanged"""
+        with self._lock:
+            con = self._connect()
+            with con:
+                con.execute(
+                    "UPDATE Archives SET inode = ?, size = ?, mtime_ns = ? WHERE path = ?",
+                    (inode, size, mtime_ns, str(path)),
+                )
+
+    def remove(self, *paths: pathlib.Path) -> None:
+        with self._lock:
+            con = self._connect()
+            with con:
+                for table in ("Archives", "TagFields", "Invalid"):
+                    con.executemany(f"DELETE FROM {table} WHERE path = ?", [(str(path),) for path in paths])
+
+    def get_stat(self, path: pathlib.Path) -> tuple[int, int, int, bool] | None:
+        """Returns the (inode, size, mtime_ns, valid) of path if it is in the index, valid is False for set_invalid"""
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    """SELECT inode, size, mtime_ns, 1 AS valid FROM Archives WHERE path = ?
+                    UNION ALL SELECT inode, size, mtime_ns, 0 AS valid FROM Invalid WHERE path = ?""",
+                    (str(path), str(path)),
+                )
+                .fetchone()
+            )
+        return None if row is None else (row["inode"], row["size"], row["mtime_ns"], bool(row["valid"]))
+
+    def get_stats(self, folder: pathlib.Path) -> dict[pathlib.Path, tuple[int, int, int, bool]]:
+        """Returns the (inode, size, mtime_ns, valid) of every file in the index under folder, see get_stat"""
+        # Every path under folder sorts between folder + os.sep and the next character after os.sep
+        prefix = os.path.join(str(folder), "")
+        bounds = (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(
+                    """SELECT path, inode, size, mtime_ns, 1 AS valid FROM Archives WHERE path >= ? AND path < ?
+                    UNION ALL SELECT path, inode, size, mtime_ns, 0 AS valid FROM Invalid WHERE path >= ? AND path < ?""",
+                    bounds * 2,
+                )
+                .fetchall()
+            )
+        return {
+            pathlib.Path(row["path"]): (row["inode"], row["size"], row["mtime_ns"], bool(row["valid"])) for row in rows
+        }
+
+    def query(self, query: str) -> list[pathlib.Path]:
+        """
+        Returns the paths of the archives that match query, see parse_query.
+        The query is only answered from the index, run a scan first for the results to be current.
+        Raises ValueError for an invalid query.
+        """
+        where: list[str] = []
+        field_where: list[str] = []
+        params: list[Any] = []
+        field_params: list[Any] = []
+        for term in parse_query(query):
+            if term.field in ("has", "missing"):
+                exists = "EXISTS (SELECT 1 FROM TagFields h WHERE h.path = Archives.path AND h.tag_id = ?)"
+                where.append(exists if term.field == "has" else f"NOT {exists}")
+                params.append(term.value)
+            elif term.field == "tag":
+                field_where.append("t.tag_id = ?")
+                field_params.append(term.value)
+            elif term.op == ":" and query_fields[term.field] == "TEXT":
+                escaped = term.value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                field_where.append(f"t.{term.field} LIKE ? ESCAPE '\\'")
+                field_params.append(f"%{escaped}%")
+            elif term.op == "!=":
+                field_where.append(f"(t.{term.field} IS NULL OR t.{term.field} != ? COLLATE NOCASE)")
+                field_params.append(term.value)
+            else:
+                op = "=" if term.op == ":" else term.op
+                field_where.append(f"t.{term.field} {op} ? COLLATE NOCASE")
+                field_params.append(term.value if query_fields[term.field] == "TEXT" else float(term.value))
+
+        sql = "SELECT DISTINCT Archives.path FROM Archives"
+        if field_where:
+            sql += " JOIN TagFields t ON t.path = Archives.path"
+        if where or field_where:
+            sql += " WHERE " + " AND ".join(field_where + where)
+        sql += " ORDER BY Archives.path"
+        with self._lock:
+            rows = self._connect().execute(sql, field_params + params).fetchall()
+        return [pathlib.Path(row["path"]) for row in rows]
+
+    def rename(self, path: pathlib.Path, new_path: pathlib.Path) -> None:
+        with self._lock:
+            con = self._connect()
+            with con:
+                for table in ("Archives", "TagFields", "Invalid"):
+                    con.execute(f"DELETE FROM {table} WHERE path = ?", [str(new_path)])
+                    con.execute(f"UPDATE {table} SET path = ? WHERE path = ?", (str(new_path), str(path)))
+
+    def is_processed(self, path: pathlib.Path, action: str, inode: int, size: int, mtime_ns: int) -> bool:
+        """Returns True if path was processed by action and has not changed since"""
+        with self._lock:
+            row = (
+                self._connect()
+                .execute("SELECT inode, size, mtime_ns FROM Watched WHERE path = ? AND action = ?", (str(path), action))
+                .fetchone()
+            )
+        return row is not None and tuple(row) == (inode, size, mtime_ns)
+
+    def set_processed(
+        self, path: pathlib.Path, action: str, inode: int, size: int, mtime_ns: int, status: str | None
+    ) -> None:
+        """Records that path was processed by action, status is recorded for failures as well"""
+        with self._lock:
+            con = self._connect()
+            with con:
+                con.execute(
+                    """INSERT OR REPLACE INTO Watched
+                    (path, action, inode, size, mtime_ns, status) VALUES (?, ?, ?, ?, ?, ?)""",
+                    (str(path), action, inode, size, mtime_ns, status),
+                )
@@ -100,21 +100,19 @@ class ComicRack(Tag):
         return self.has_tags(archive) and archive.remove_file(self.file)
 
     def read_tags(self, archive: Archiver) -> GenericMetadata:
-        if self.has_tags(archive):
-            try:  # read_file can cause an exception
-                metadata = archive.read_file(self.file) or b""
-                if self._validate_bytes(metadata):
-                    return self._metadata_from_bytes(metadata)
-            except Exception:
-                ...
+        try:  # read_file and parsing can cause an exception
+            root = self._read_root(archive)
+            if root is not None:
+                return self._convert_xml_to_metadata(root)
+        except Exception:
+            ...
         return GenericMetadata()
 
     def read_raw_tags(self, archive: Archiver) -> str:
-        try:  # read_file can cause an exception
-            if self.has_tags(archive):
-                b = archive.read_file(self.file)
-                # ET.fromstring is used as xml can declare the encoding
-                return ET.tostring(ET.fromstring(b), encoding="unicode", xml_declaration=True)
+        try:  # read_file and parsing can cause an exception
+            root = self._read_root(archive)
+            if root is not None:
+                return ET.tostring(root, encoding="unicode", xml_declaration=True)
         except Exception:
             ...
         return ""
@@ -123,8 +121,10 @@ class ComicRack(Tag):
         if self.supports_tags(archive):
             xml = b""
             try:  # read_file can cause an exception
-                if self.has_tags(archive):
+                if self.file in archive.get_filename_list():
                     xml = archive.read_file(self.file)
+                    if not self._validate_bytes(xml):
+                        xml = b""
                 return archive.write_file(self.file, self._bytes_from_metadata(metadata, xml))
             except Exception:
                 ...
@@ -147,6 +147,19 @@ class ComicRack(Tag):
         parsable_credits.extend(GenericMetadata.editor_synonyms)
         return parsable_credits
 
+    def _read_root(self, archive: Archiver) -> ET.Element | None:
+        """
+        Lists the archive and reads and parses the ComicInfo.xml once.
+        Returns None if the archive has no ComicInfo.xml, parsing errors are raised.
+        """
+        if not self.supports_tags(archive) or self.file not in archive.get_filename_list():
+            return None
+        # ET.fromstring is used as xml can declare the encoding
+        root = ET.fromstring(archive.read_file(self.file))
+        if root.tag != "ComicInfo":
+            return None
+        return root
+
     def _metadata_from_bytes(self, string: bytes) -> GenericMetadata:
         root = ET.fromstring(string)
         return self._convert_xml_to_metadata(root)
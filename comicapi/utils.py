@@ -23,7 +23,7 @@ import platform
 import sys
 import unicodedata
 from collections import defaultdict
-from collections.abc import Iterable, Mapping
+from collections.abc import Iterable, Iterator, Mapping
 from enum import Enum, auto
 from shutil import which  # noqa: F401
 from typing import Any, TypeVar, cast
@@ -326,6 +326,28 @@ def get_recursive_filelist(pathlist: list[str]) -> list[str]:
     return filelist
 
 
+def scan_files(folder: str) -> Iterator[tuple[str, os.stat_result]]:
+    """
+    Yields the path and stat of every file under folder using os.scandir.
+    Symlinks to folders are not followed, folders that cannot be read are logged and skipped.
+    """
+    folders = [folder]
+    while folders:
+        current = folders.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            folders.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path, entry.stat()
+                    except OSError as e:
+                        logger.debug("Unable to stat %s: %s", entry.path, e)
+        except OSError as e:
+            logger.error("Unable to scan %s: %s", current, e)
+
+
 def add_to_path(dirname: str) -> None:
     if dirname:
         dirname = os.path.abspath(dirname)
@@ -260,15 +260,14 @@ class AutoTagMatchWindow(QtWidgets.QDialog):
 
         QtWidgets.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.CursorShape.WaitCursor))
         md = prepare_metadata(md, ct_md, self.config)
-        for tag_id in self._tags:
-            success = ca.write_tags(md, tag_id)
-            QtWidgets.QApplication.restoreOverrideCursor()
-            if not success:
-                QtWidgets.QMessageBox.warning(
-                    self,
-                    "Write Error",
-                    f"Saving {tags[tag_id].name()} the tags to the archive seemed to fail!",
-                )
-                break
+        success = ca.write_tags(md, self._tags)
+        QtWidgets.QApplication.restoreOverrideCursor()
+        if not success:
+            tag_names = ", ".join(tags[tag_id].name() for tag_id in self._tags)
+            QtWidgets.QMessageBox.warning(
+                self,
+                "Write Error",
+                f"Saving {tag_names} the tags to the archive seemed to fail!",
+            )
 
         ca.reset_cache()
@@ -16,6 +16,8 @@
 # limitations under the License.
 from __future__ import annotations
 
+import collections
+import concurrent.futures
 import dataclasses
 import functools
 import json
@@ -24,12 +26,13 @@ import os
 import pathlib
 import re
 import sys
-from collections.abc import Collection
+from collections.abc import Collection, Iterator
 from typing import Any, TextIO
 
 from comicapi import merge, utils
 from comicapi.comicarchive import ComicArchive, tags
 from comicapi.genericmetadata import GenericMetadata
+from comicapi.libraryindex import LibraryIndex
 from comictaggerlib.cbltransformer import CBLTransformer
 from comictaggerlib.ctsettings import ct_ns
 from comictaggerlib.filerenamer import FileRenamer, get_rename_dir
@@ -37,7 +40,8 @@ from comictaggerlib.graphics import graphics_path
 from comictaggerlib.issueidentifier import IssueIdentifier
 from comictaggerlib.md import prepare_metadata
 from comictaggerlib.quick_tag import QuickTag
-from comictaggerlib.resulttypes import Action, IssueResult, MatchStatus, OnlineMatchResults, Result, Status
+from comictaggerlib.resulttypes import Action, IssueResult, MatchStatus, OnlineMatchResults, Result, ScanStatus, Status
+from comictaggerlib.watch import Watcher
 from comictalker.comictalker import ComicTalker, TalkerError
 
 logger = logging.getLogger(__name__)
@@ -93,17 +97,25 @@ class CLI:
             print(*args, **kwargs, file=file)
 
     def run(self) -> int:
+        if self.config.Commands__command == Action.query:
+            return self.query(self.config.Commands__query)
+
         if len(self.config.Runtime_Options__files) < 1:
             logger.error("You must specify at least one filename.  Use the -h option for more info")
             return 1
         return_code = 0
 
+        if self.config.Commands__command == Action.scan:
+            return self.scan(self.config.Runtime_Options__files)
+
+        if self.config.Runtime_Options__watch:
+            return self.watch(self.config.Runtime_Options__files)
+
         results: list[Result] = []
         match_results = OnlineMatchResults()
         self.batch_mode = len(self.config.Runtime_Options__files) > 1
 
-        for f in self.config.Runtime_Options__files:
-            res, match_results = self.process_file_cli(self.config.Commands__command, f, match_results)
+        for res, match_results in self.process_files(match_results):
             results.append(res)
             if results[-1].status != Status.success:
                 return_code = 3
@@ -120,6 +132,17 @@ class CLI:
             )
         return return_code
 
+    def process_files(self, match_results: OnlineMatchResults) -> Iterator[tuple[Result, OnlineMatchResults]]:
+        if self.config.Commands__command == Action.verify:
+            # Verifying is dominated by decompression which releases the GIL, so archives are checked in parallel
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                yield from executor.map(
+                    lambda f: self.process_file_cli(Action.verify, f, match_results), self.config.Runtime_Options__files
+                )
+        else:
+            for f in self.config.Runtime_Options__files:
+                yield self.process_file_cli(self.config.Commands__command, f, match_results)
+
     def fetch_metadata(self, issue_id: str) -> GenericMetadata:
         # now get the particular issue data
         try:
@@ -135,11 +158,13 @@ class CLI:
 
     def write_tags(self, ca: ComicArchive, md: GenericMetadata) -> bool:
         if not self.config.Runtime_Options__dryrun:
-            for tag_id in self.config.Runtime_Options__tags_write:
-                # write out the new data
-                if not ca.write_tags(md, tag_id):
-                    logger.error("The tag save seemed to fail for: %s!", tags[tag_id].name())
-                    return False
+            # write out the new data
+            if not ca.write_tags(md, self.config.Runtime_Options__tags_write):
+                logger.error(
+                    "The tag save seemed to fail for: %s!",
+                    ", ".join(tags[tag_id].name() for tag_id in self.config.Runtime_Options__tags_write),
+                )
+                return False
 
             self.output("Save complete.")
         else:
@@ -254,18 +279,17 @@ class CLI:
         file_md = GenericMetadata()
         tags_used = []
         for tag_id in tags_to_read:
-            if ca.has_tags(tag_id):
-                try:
-                    t_md = ca.read_tags(tag_id)
-                    if not t_md.is_empty:
-                        file_md.overlay(
-                            t_md,
-                            self.config.Metadata_Options__tag_merge,
-                            self.config.Metadata_Options__tag_merge_lists,
-                        )
-                        tags_used.append(tag_id)
-                except Exception as e:
-                    logger.error("Failed to load metadata for %s: %s", ca.path, e)
+            try:
+                t_md = ca.read_tags(tag_id)
+                if not t_md.is_empty:
+                    file_md.overlay(
+                        t_md,
+                        self.config.Metadata_Options__tag_merge,
+                        self.config.Metadata_Options__tag_merge_lists,
+                    )
+                    tags_used.append(tag_id)
+            except Exception as e:
+                logger.error("Failed to load metadata for %s: %s", ca.path, e)
 
         filename_merge = merge.Mode.ADD_MISSING
         if self.config.Auto_Tag__prefer_filename:
@@ -770,6 +794,147 @@ class CLI:
 
         return Result(Action.export, Status.success, ca.path, new_file)
 
+    def verify(self, ca: ComicArchive) -> Result:
+        msg_hdr = ""
+        if self.batch_mode:
+            msg_hdr = f"{ca.path}: "
+
+        if ca.verify():
+            self.output(msg_hdr + "Archive is OK")
+            return Result(Action.verify, Status.success, ca.path)
+
+        self.output(msg_hdr + "Archive failed verification!", force_output=True)
+        return Result(Action.verify, Status.read_failure, ca.path)
+
+    def library_index(self) -> LibraryIndex:
+        """Returns the library index, --scan and --query use it even if --library-index is not set"""
+        if ComicArchive.library_index is None:
+            db_file = self.config.Runtime_Options__config.user_cache_dir / "library_index.db"
+            ComicArchive.library_index = LibraryIndex(db_file)
+        return ComicArchive.library_index
+
+    def query(self, query: str) -> int:
+        index = self.library_index()
+        try:
+            paths = index.query(query)
+        except ValueError as e:
+            logger.error("Invalid query %r: %s", query, e)
+            return 1
+
+        for path in paths:
+            if not self.config.Runtime_Options__json:
+                print(path)  # noqa: T201
+                continue
+            entry = index.get(path)
+            md = {} if entry is None else {k: dataclasses.asdict(v) for k, v in entry.tags.items() if not v.is_empty}
+            print(json.dumps({"path": path, "tags": md}, cls=OutputEncoder), flush=True)  # noqa: T201
+        return 0
+
+    def scan(self, paths: list[str]) -> int:
+        """
+        Updates the library index with every archive under paths.
+        Files whose inode, size and mtime match the index are not opened, this includes files that were found not to be
+        archives. Entries for files that no longer exist are removed. The status of every file is printed as one JSON object per line, followed by a summary.
+        """
+        index = self.library_index()
+
+        def emit(obj: dict[str, Any]) -> None:
+            print(json.dumps(obj, cls=OutputEncoder), flush=True)  # noqa: T201
+
+        counts: collections.Counter[ScanStatus] = collections.Counter()
+        for path in paths:
+            root = pathlib.Path(path).absolute()
+            if root.is_dir():
+                known = index.get_stats(root)
+                files = utils.scan_files(str(root))
+            else:
+                stat = index.get_stat(root)
+                known = {root: stat} if stat is not None else {}
+                files = iter([(str(root), root.stat())]) if root.is_file() else iter([])
+
+            for filename, st in files:
+                file_path = pathlib.Path(filename)
+                status = self.scan_file(file_path, st, known.pop(file_path, None))
+                counts[status] += 1
+                emit({"path": file_path, "status": status})
+
+            # Anything left was not found, folder archives and files in unreadable folders still exist
+            vanished = [p for p in known if not os.path.lexists(p)]
+            index.remove(*vanished)
+            for file_path in vanished:
+                counts[ScanStatus.removed] += 1
+                emit({"path": file_path, "status": ScanStatus.removed})
+
+        emit({"summary": {status: counts[status] for status in ScanStatus}})
+        return 3 if counts[ScanStatus.read_failure] else 0
+
+    def scan_file(
+        self, path: pathlib.Path, st: os.stat_result, indexed: tuple[int, int, int, bool] | None
+    ) -> ScanStatus:
+        if indexed is not None and indexed[:3] == (st.st_ino, st.st_size, st.st_mtime_ns):
+            return ScanStatus.unchanged if indexed[3] else ScanStatus.invalid
+        try:
+            ca = ComicArchive(path)
+            if not ca.seems_to_be_a_comic_archive():
+                assert ComicArchive.library_index is not None
+                ComicArchive.library_index.set_invalid(path, st.st_ino, st.st_size, st.st_mtime_ns)
+                return ScanStatus.invalid
+            # Reading the tags adds them to the library index
+            ca.load_cache(tags)
+        except Exception as e:
+            logger.error("Failed to scan %s: %s", path, e)
+            return ScanStatus.read_failure
+        return ScanStatus.new if indexed is None else ScanStatus.changed
+
+    def watch(self, folders: list[str]) -> int:
+        """
+        Runs the command on every archive added to or changed in folders until interrupted.
+        Archives are recorded in the library index after they are processed, so that restarting only processes the
+        archives that arrived or changed while stopped.
+        """
+        index = self.library_index()
+        command = self.config.Commands__command
+        self.batch_mode = True
+
+        with Watcher(
+            [pathlib.Path(folder).absolute() for folder in folders], self.config.Runtime_Options__watch_settle
+        ) as watcher:
+            logger.info("Watching %s", ", ".join(folders))
+            try:
+                for paths in watcher:
+                    match_results = OnlineMatchResults()
+                    for path in paths:
+                        match_results = self.watch_file(index, command, path, match_results)
+                    self.post_process_matches(match_results)
+            except KeyboardInterrupt:
+                pass
+        return 0
+
+    def watch_file(
+        self, index: LibraryIndex, command: Action, path: pathlib.Path, match_results: OnlineMatchResults
+    ) -> OnlineMatchResults:
+        try:
+            st = path.stat()
+        except OSError:
+            return match_results
+        if index.is_processed(path, command, st.st_ino, st.st_size, st.st_mtime_ns):
+            return match_results
+
+        res, match_results = self.process_file_cli(command, str(path), match_results)
+        if self.config.Runtime_Options__json:
+            print(json.dumps(dataclasses.asdict(res), cls=OutputEncoder, indent=2))
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        # Recorded after processing so that writing tags or renaming doesn't process the archive again
+        final_path = res.renamed_path or path
+        try:
+            st = final_path.stat()
+        except OSError:
+            return match_results
+        index.set_processed(final_path, command, st.st_ino, st.st_size, st.st_mtime_ns, res.status)
+        return match_results
+
     def process_file_cli(
         self, command: Action, filename: str, match_results: OnlineMatchResults
     ) -> tuple[Result, OnlineMatchResults]:
@@ -788,20 +953,29 @@ class CLI:
             return Result(command, Status.write_permission_failure, ca.path), match_results
 
         if command == Action.print:
-            return self.print(ca), match_results
+            res = self.print(ca)
 
         elif command == Action.delete:
-            return self.delete(ca), match_results
+            res = self.delete(ca)
 
         elif command == Action.copy is not None:
-            return self.copy(ca), match_results
+            res = self.copy(ca)
 
         elif command == Action.save:
-            return self.save(ca, match_results)
+            res, match_results = self.save(ca, match_results)
 
         elif command == Action.rename:
-            return self.rename(ca), match_results
+            res = self.rename(ca)
 
         elif command == Action.export:
-            return self.export(ca), match_results
-        return Result(None, Status.read_failure, ca.path), match_results  # type: ignore[arg-type]
+            res = self.export(ca)
+
+        elif command == Action.verify:
+            res = self.verify(ca)
+        else:
+            res = Result(None, Status.read_failure, ca.path)  # type: ignore[arg-type]
+
+        if self.config.Runtime_Options__json:
+            # Gives external tools a key for the archive that survives renames
+            res.fingerprint = ca.fingerprint()
+        return res, match_results
@@ -173,6 +173,20 @@ def register_runtime(parser: settngs.Manager) -> None:
         help="""Skip archives that already have tags specified with -t,\notherwise merges new tags with existing tags (relevant for -s or -c).\ndefault: %(default)s""",
         file=False,
     )
+    parser.add_setting(
+        "--watch",
+        action="store_true",
+        help="""Keep running and run the command on every archive that is added to or changed in the given folders\nand their sub-folders, archives already processed are skipped on restart.\nOnly -p, -d, -c, -s, -r, -e and --verify can be used.\n\n""",
+        file=False,
+    )
+    parser.add_setting(
+        "--watch-settle",
+        type=float,
+        default=5.0,
+        metavar="SECONDS",
+        help="""With --watch, wait until an archive has not changed for SECONDS before processing it.\ndefault: %(default)s\n\n""",
+        file=False,
+    )
     parser.add_setting("files", nargs="*", default=[], file=False)
 
 
@@ -234,6 +248,29 @@ def register_commands(parser: settngs.Manager) -> None:
         help="Export archive to Zip format.",
         file=False,
     )
+    parser.add_setting(
+        "--verify",
+        dest="command",
+        action="store_const",
+        const=Action.verify,
+        help="Check the integrity of every file in the archive.\nArchives are checked in parallel.\n\n",
+        file=False,
+    )
+    parser.add_setting(
+        "--scan",
+        dest="command",
+        action="store_const",
+        const=Action.scan,
+        help="Recursively scan the given folders and update the library index.\nOnly new or changed archives are read, progress is printed as one JSON object per line.\n\n",
+        file=False,
+    )
+    parser.add_setting(
+        "--query",
+        default="",
+        metavar="QUERY",
+        help="""Print the archives in the library index that match QUERY, without opening them.\nTerms are separated by spaces and must all match eg "series:batman year>=1990 missing:cr".\nfield:value matches text containing value, =, !=, <, <=, > and >= compare the whole value.\nhas:ID and missing:ID match archives with and without tags, tag:ID limits the other terms to those tags.\nUse --scan to update the index first, use --json to print the tags as well.\n\n""",
+        file=False,
+    )
     parser.add_setting(
         "--only-save-config",
         dest="command",
@@ -269,9 +306,17 @@ def validate_commandline_settings(config: settngs.Config[ct_ns], parser: settngs
         )
 
     config[0].Runtime_Options__no_gui = any(
-        (config[0].Commands__command != Action.gui, config[0].Runtime_Options__no_gui, config[0].Commands__copy)
+        (
+            config[0].Commands__command != Action.gui,
+            config[0].Runtime_Options__no_gui,
+            config[0].Commands__copy,
+            config[0].Commands__query,
+        )
     )
 
+    if config[0].Commands__query:
+        config[0].Commands__command = Action.query
+
     if platform.system() == "Windows" and config[0].Runtime_Options__glob:
         # no globbing on windows shell, so do it for them
         import glob
@@ -288,7 +333,7 @@ def validate_commandline_settings(config: settngs.Config[ct_ns], parser: settngs
         config[0].Runtime_Options__tags_write = config[0].Runtime_Options__tags_read
 
     if (
-        config[0].Commands__command not in (Action.save_config, Action.list_plugins)
+        config[0].Commands__command not in (Action.save_config, Action.list_plugins, Action.query)
         and config[0].Runtime_Options__no_gui
         and not config[0].Runtime_Options__files
     ):
@@ -305,7 +350,20 @@ def validate_commandline_settings(config: settngs.Config[ct_ns], parser: settngs
         if not config[0].Runtime_Options__tags_write:
             parser.exit(message="Please specify the tags to copy to with --tags-write\n", status=1)
 
-    if config[0].Runtime_Options__recursive:
+    if config[0].Runtime_Options__watch:
+        if config[0].Commands__command not in (
+            Action.print,
+            Action.delete,
+            Action.copy,
+            Action.save,
+            Action.rename,
+            Action.export,
+            Action.verify,
+        ):
+            parser.exit(message="--watch requires one of -p, -d, -c, -s, -r, -e or --verify\n", status=1)
+        if not all(os.path.isdir(f) for f in config[0].Runtime_Options__files):
+            parser.exit(message="--watch requires folders to watch\n", status=1)
+    elif config[0].Runtime_Options__recursive:
         config[0].Runtime_Options__files = utils.get_recursive_filelist(config[0].Runtime_Options__files)
 
     # take a crack at finding rar exe if it's not in the path
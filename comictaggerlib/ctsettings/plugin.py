@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import argparse
 import logging
 import os
 from typing import Any, cast
 
 import settngs
 
+import comicapi.archivers.rar
 import comicapi.comicarchive
+import comicapi.libraryindex
 import comicapi.utils
 import comictaggerlib.ctsettings
 from comicapi.comicarchive import Archiver
@@ -25,6 +28,27 @@ def group_for_plugin(plugin: Archiver | ComicTalker | type[Archiver]) -> str:
 
 
 def archiver(manager: settngs.Manager) -> None:
+    manager.add_setting(
+        "--archive-validation",
+        dest="validation",
+        default=comicapi.comicarchive.Validation.QUICK,
+        metavar=f"{{{','.join(comicapi.comicarchive.Validation)}}}",
+        type=comicapi.comicarchive.Validation,
+        choices=comicapi.comicarchive.Validation,
+        help="How thoroughly archives are checked when they are opened.\nquick only reads what is needed to open the archive, full reads and checks every file.\nUse --verify to check archives separately.\ndefault: %(default)s",
+    )
+    manager.add_setting(
+        "--page-workers",
+        default=4,
+        type=int,
+        help="Number of threads used to read page sizes and dimensions.\nAt most twice this many pages are held in memory at once.\ndefault: %(default)s",
+    )
+    manager.add_setting(
+        "--library-index",
+        default=False,
+        action=argparse.BooleanOptionalAction,
+        help="Keep an index of the pages and tags of every archive that is read in the cache dir.\nArchives that have not changed since they were indexed are not opened again.\ndefault: %(default)s",
+    )
     for archiver in comicapi.comicarchive.archivers:
         if archiver.exe:
             # add_setting will overwrite anything with the same name.
@@ -62,6 +86,18 @@ def register_talker_settings(manager: settngs.Manager, talkers: dict[str, ComicT
 
 
 def validate_archive_settings(config: settngs.Config[ct_ns]) -> settngs.Config[ct_ns]:
+    comicapi.comicarchive.ComicArchive.validation = config[0].Archive__validation
+    comicapi.comicarchive.ComicArchive.page_workers = max(1, config[0].Archive__page_workers)
+
+    index = comicapi.comicarchive.ComicArchive.library_index
+    db_file = config[0].Runtime_Options__config.user_cache_dir / "library_index.db"
+    if index is not None and (not config[0].Archive__library_index or index.db_file != db_file):
+        index.close()
+        index = None
+    if index is None and config[0].Archive__library_index:
+        index = comicapi.libraryindex.LibraryIndex(db_file)
+    comicapi.comicarchive.ComicArchive.library_index = index
+
     cfg = settngs.normalize_config(config, file=True, cmdline=True, default=False)
     for archiver in comicapi.comicarchive.archivers:
         group = group_for_plugin(archiver())
@@ -79,6 +115,8 @@ def validate_archive_settings(config: settngs.Config[ct_ns]) -> settngs.Config[c
 
             archiver.exe = path
 
+    # the executables may have changed, probe them again when they are next needed
+    comicapi.archivers.rar.clear_tool_cache()
     return config
 
 
@@ -5,6 +5,7 @@ import typing
 import settngs
 import urllib3.util.url
 
+import comicapi.comicarchive
 import comicapi.genericmetadata
 import comicapi.merge
 import comicapi.utils
@@ -17,6 +18,7 @@ class SettngsNS(settngs.TypedNS):
     Commands__version: bool
     Commands__command: comictaggerlib.resulttypes.Action
     Commands__copy: list[str]
+    Commands__query: str
 
     Runtime_Options__config: comictaggerlib.ctsettings.types.ComicTaggerPaths
     Runtime_Options__verbose: int
@@ -37,6 +39,8 @@ class SettngsNS(settngs.TypedNS):
     Runtime_Options__tags_read: list[str]
     Runtime_Options__tags_write: list[str]
     Runtime_Options__skip_existing_tags: bool
+    Runtime_Options__watch: bool
+    Runtime_Options__watch_settle: float
     Runtime_Options__files: list[str]
 
     Quick_Tag__url: urllib3.util.url.Url
@@ -125,6 +129,9 @@ class SettngsNS(settngs.TypedNS):
     Dialog_Flags__dont_notify_about_this_version: str
     Dialog_Flags__notify_plugin_changes: bool
 
+    Archive__validation: comicapi.comicarchive.Validation
+    Archive__page_workers: int
+    Archive__library_index: bool
     Archive__rar: str
 
     Source_comicvine__comicvine_key: str | None
@@ -136,6 +143,7 @@ class Commands(typing.TypedDict):
     version: bool
     command: comictaggerlib.resulttypes.Action
     copy: list[str]
+    query: str
 
 
 class Runtime_Options(typing.TypedDict):
@@ -158,6 +166,8 @@ class Runtime_Options(typing.TypedDict):
     tags_read: list[str]
     tags_write: list[str]
     skip_existing_tags: bool
+    watch: bool
+    watch_settle: float
     files: list[str]
 
 
@@ -268,6 +278,9 @@ class Dialog_Flags(typing.TypedDict):
 
 
 class Archive(typing.TypedDict):
+    validation: comicapi.comicarchive.Validation
+    page_workers: int
+    library_index: bool
     rar: str
 
 
@@ -387,19 +387,19 @@ class IssueIdentifier:
 
         return images
 
-    def _get_images(self, ca: ComicArchive, md: GenericMetadata) -> list[tuple[str, Image.Image]]:
+    def _get_images(self, pages: dict[int, bytes], md: GenericMetadata) -> list[tuple[str, Image.Image]]:
         covers: list[tuple[str, Image.Image]] = []
         for cover_index in md.get_cover_page_index_list():
-            image_data = ca.get_page(cover_index)
-            covers.extend(self._process_cover(f"{cover_index}", image_data))
+            covers.extend(self._process_cover(f"{cover_index}", pages[cover_index]))
         return covers
 
-    def _get_extra_images(self, ca: ComicArchive, md: GenericMetadata) -> list[tuple[str, Image.Image]]:
+    def _get_extra_images(
+        self, ca: ComicArchive, pages: dict[int, bytes], md: GenericMetadata
+    ) -> list[tuple[str, Image.Image]]:
         assert md
         covers: list[tuple[str, Image.Image]] = []
         for cover_index in range(1, min(3, ca.get_number_of_pages())):
-            image_data = ca.get_page(md.get_archive_page_index(cover_index))
-            covers.extend(self._process_cover(f"{cover_index}", image_data))
+            covers.extend(self._process_cover(f"{cover_index}", pages[md.get_archive_page_index(cover_index)]))
         return covers
 
     def _get_search_keys(self, md: GenericMetadata) -> Any:
@@ -419,7 +419,13 @@ class IssueIdentifier:
     def _get_search_terms(
         self, ca: ComicArchive, md: GenericMetadata
     ) -> tuple[SearchKeys, list[tuple[str, Image.Image]], list[tuple[str, Image.Image]]]:
-        return self._get_search_keys(md), self._get_images(ca, md), self._get_extra_images(ca, md)
+        # read the covers and the extra pages in one pass
+        page_indexes = {
+            *md.get_cover_page_index_list(),
+            *(md.get_archive_page_index(i) for i in range(1, min(3, ca.get_number_of_pages()))),
+        }
+        pages = dict(ca.iter_pages(page_indexes))
+        return self._get_search_keys(md), self._get_images(pages, md), self._get_extra_images(ca, pages, md)
 
     def _user_canceled(self, callback: Callable[..., Any] | None = None, *args: Any) -> Any:
         if self.cancel:
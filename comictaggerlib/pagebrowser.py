@@ -60,12 +60,18 @@ class PageBrowserWindow(QtWidgets.QDialog):
 
         self.btnNext.clicked.connect(self.next_page)
         self.btnPrev.clicked.connect(self.prev_page)
+        self.finished.connect(self.close_archive)
         self.show()
 
         self.btnNext.setEnabled(False)
         self.btnPrev.setEnabled(False)
 
+    def close_archive(self) -> None:
+        if self.comic_archive is not None:
+            self.comic_archive.close_session()
+
     def reset(self) -> None:
+        self.close_archive()
         self.comic_archive = None
         self.page_count = 0
         self.current_page_num = 0
@@ -76,6 +82,9 @@ class PageBrowserWindow(QtWidgets.QDialog):
         self.pageWidget.clear()
 
     def set_comic_archive(self, ca: ComicArchive) -> None:
+        self.close_archive()
+        # Keep the archive open while browsing so each page doesn't re-read the archive directory
+        ca.open_session()
         self.comic_archive = ca
         self.page_count = ca.get_number_of_pages()
         self.current_page_num = 0
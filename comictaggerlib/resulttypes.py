@@ -37,6 +37,9 @@ class Action(utils.StrEnum):
     save = auto()
     rename = auto()
     export = auto()
+    verify = auto()
+    scan = auto()
+    query = auto()
     save_config = auto()
     list_plugins = auto()
 
@@ -59,6 +62,15 @@ class Status(utils.StrEnum):
     rename_failure = auto()
 
 
+class ScanStatus(utils.StrEnum):
+    new = auto()
+    changed = auto()
+    unchanged = auto()
+    removed = auto()
+    invalid = auto()
+    read_failure = auto()
+
+
 @dataclasses.dataclass
 class OnlineMatchResults:
     good_matches: list[Result] = dataclasses.field(default_factory=list)
@@ -86,6 +98,9 @@ class Result:
     tags_deleted: list[str] = dataclasses.field(default_factory=list)
     tags_written: list[str] = dataclasses.field(default_factory=list)
 
+    # See ComicArchive.fingerprint, only set for json output
+    fingerprint: str | None = None
+
     def __str__(self) -> str:
         if len(self.online_results) == 0:
             matches = None
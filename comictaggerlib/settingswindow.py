@@ -31,12 +31,14 @@ from PyQt5 import QtCore, QtGui, QtWidgets, uic
 import comictaggerlib.ui.talkeruigenerator
 from comicapi import merge, utils
 from comicapi.archivers.archiver import Archiver
+from comicapi.comicarchive import ComicArchive
 from comicapi.genericmetadata import md_test
 from comictaggerlib import ctsettings
 from comictaggerlib.ctsettings import ct_ns
 from comictaggerlib.ctsettings.plugin import group_for_plugin
 from comictaggerlib.filerenamer import FileRenamer, Replacement, Replacements
 from comictaggerlib.ui import ui_path
+from comictalker.comiccacher import close_cachers
 from comictalker.comictalker import ComicTalker
 
 logger = logging.getLogger(__name__)
@@ -554,6 +556,7 @@ class SettingsWindow(QtWidgets.QDialog):
             # make sure rar program is now in the path for the rar class
             if self.config[0].Archive__rar:
                 utils.add_to_path(os.path.dirname(str(self.leRarExePath.text())))
+            self.config = ctsettings.plugin.validate_archive_settings(self.config)
 
         if not str(self.leIssueNumPadding.text()).isdigit():
             self.leIssueNumPadding.setText("0")
@@ -632,6 +635,9 @@ class SettingsWindow(QtWidgets.QDialog):
         self.update_rar_path()
 
     def clear_cache(self) -> None:
+        if ComicArchive.library_index is not None:
+            ComicArchive.library_index.close()
+        close_cachers()
         shutil.rmtree(self.config[0].Runtime_Options__config.user_cache_dir, ignore_errors=True)
         self.config[0].Runtime_Options__config.user_cache_dir.mkdir(parents=True, exist_ok=True)
         QtWidgets.QMessageBox.information(self, self.name, "Cache has been cleared.")
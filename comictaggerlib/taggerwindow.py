@@ -74,6 +74,64 @@ def execute(f: Callable[[], Any]) -> None:
     f()
 
 
+def clear_page_sizes(md: GenericMetadata) -> None:
+    for p in md.pages:
+        p.byte_size = None
+        p.height = None
+        p.width = None
+
+
+class PageDimensionsThread(QtCore.QThread):
+    """
+    Recalculates the page sizes and dimensions of several archives one after the other,
+    the pages of each archive are read using ComicArchive.page_workers threads.
+    An archive with metadata is calculated into that metadata without writing it,
+    the other archives have the given tags read, recalculated and written back.
+    """
+
+    # archive number, archive count, pages done, page count
+    progressUpdate = QtCore.pyqtSignal(int, int, int, int)
+
+    def __init__(self, jobs: list[tuple[ComicArchive, GenericMetadata | None]], tag_ids: Sequence[str]) -> None:
+        QtCore.QThread.__init__(self)
+        self.jobs = jobs
+        self.tag_ids = list(tag_ids)
+        self.success_count = 0
+        self.failed_list: list[str] = []
+
+    def run(self) -> None:
+        for number, (ca, md) in enumerate(self.jobs, 1):
+            self.progressUpdate.emit(number, len(self.jobs), 0, 0)
+            try:
+                success = self.recalc(
+                    ca, md, lambda done, total: self.progressUpdate.emit(number, len(self.jobs), done, total)
+                )
+            except Exception:
+                logger.exception("Failed to recalculate the page dimensions of %s", ca.path)
+                success = False
+            if success:
+                self.success_count += 1
+            else:
+                self.failed_list.append(str(ca.path))
+
+    def recalc(
+        self, ca: ComicArchive, md: GenericMetadata | None, progress_callback: Callable[[int, int], None]
+    ) -> bool:
+        if md is not None:
+            clear_page_sizes(md)
+            ca.apply_archive_info_to_metadata(md, True, True, progress_callback)
+            return True
+
+        for tag_id in self.tag_ids:
+            if ca.has_tags(tag_id):
+                md = ca.read_tags(tag_id)
+                clear_page_sizes(md)
+                ca.apply_archive_info_to_metadata(md, True, True, progress_callback)
+                if not ca.write_tags(md, tag_id):
+                    return False
+        return True
+
+
 class TaggerWindow(QtWidgets.QMainWindow):
     appName = "ComicTagger"
     version = ctversion.version
@@ -240,6 +298,7 @@ class TaggerWindow(QtWidgets.QMainWindow):
 
         self.page_browser: PageBrowserWindow | None = None
         self.comic_archive: ComicArchive | None = None
+        self.recalc_thread: PageDimensionsThread | None = None
         self.dirty_flag = False
         self.droppedFile = None
         self.page_loader = None
@@ -1127,12 +1186,9 @@ class TaggerWindow(QtWidgets.QMainWindow):
             self.form_to_metadata()
 
             failed_tag: str = ""
-            # Save each tag
-            for tag_id in self.selected_write_tags:
-                success = self.comic_archive.write_tags(self.metadata, tag_id)
-                if not success:
-                    failed_tag = tags[tag_id].name()
-                    break
+            # Save all tags at once
+            if not self.comic_archive.write_tags(self.metadata, self.selected_write_tags):
+                failed_tag = ", ".join(tags[tag_id].name() for tag_id in self.selected_write_tags)
 
             self.comic_archive.load_cache(set(tags))
             QtWidgets.QApplication.restoreOverrideCursor()
@@ -1853,13 +1909,11 @@ class TaggerWindow(QtWidgets.QMainWindow):
                 )
 
                 def write_Tags() -> bool:
-                    for tag_id in self.selected_write_tags:
-                        # write out the new data
-                        if not ca.write_tags(md, tag_id):
-                            self.auto_tag_log(
-                                f"{tags[tag_id].name()} save failed! Aborting any additional tag saves.\n"
-                            )
-                            return False
+                    # write out the new data
+                    if not ca.write_tags(md, self.selected_write_tags):
+                        tag_names = ", ".join(tags[tag_id].name() for tag_id in self.selected_write_tags)
+                        self.auto_tag_log(f"{tag_names} save failed!\n")
+                        return False
                     return True
 
                 # Save tags
@@ -2094,14 +2148,79 @@ class TaggerWindow(QtWidgets.QMainWindow):
         self.metadata_to_form()
 
     def recalc_page_dimensions(self) -> None:
+        tag_ids = self.selected_write_tags
+        ca_list = [
+            ca
+            for ca in self.fileSelectionList.get_selected_archive_list()
+            if ca is not self.comic_archive and ca.is_writable() and any(ca.has_tags(tag_id) for tag_id in tag_ids)
+        ]
+        if ca_list:
+            reply = QtWidgets.QMessageBox.question(
+                self,
+                "Recalculate Page Dimensions",
+                f"Do you also want to recalculate the page dimensions of {len(ca_list)} other selected archive(s)?"
+                f" Their {', '.join(tags[tag_id].name() for tag_id in tag_ids)} tags will be saved.",
+                QtWidgets.QMessageBox.StandardButton.Yes,
+                QtWidgets.QMessageBox.StandardButton.No,
+            )
+            if reply != QtWidgets.QMessageBox.StandardButton.Yes:
+                ca_list = []
+
+        jobs: list[tuple[ComicArchive, GenericMetadata | None]] = [(ca, None) for ca in ca_list]
+        if self.comic_archive is not None:
+            jobs.insert(0, (self.comic_archive, self.metadata.copy()))
+        else:
+            clear_page_sizes(self.metadata)
+            self.set_dirty_flag()
+        if not jobs:
+            return
+
         QtWidgets.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.CursorShape.WaitCursor))
-        for p in self.metadata.pages:
-            p.byte_size = None
-            p.height = None
-            p.width = None
-        self.set_dirty_flag()
+        self.recalc_progdialog = QtWidgets.QProgressDialog("", "Cancel", 0, 0, self)
+        self.recalc_progdialog.setWindowTitle("Calculating Page Dimensions")
+        self.recalc_progdialog.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        self.recalc_progdialog.setCancelButton(None)
+        self.recalc_progdialog.setMinimumDuration(300)
+        center_window_on_parent(self.recalc_progdialog)
+
+        self.recalc_thread = PageDimensionsThread(jobs, tag_ids)
+        self.recalc_thread.progressUpdate.connect(self.recalc_progress)
+        self.recalc_thread.finished.connect(self.recalc_complete)
+        self.recalc_thread.start()
+
+    def recalc_progress(self, number: int, count: int, done: int, total: int) -> None:
+        self.recalc_progdialog.setMaximum(total)
+        self.recalc_progdialog.setValue(done)
+        self.recalc_progdialog.setLabelText(f"Archive {number} of {count}: page {done} of {total}")
+
+    def recalc_complete(self) -> None:
+        self.recalc_progdialog.hide()
         QtWidgets.QApplication.restoreOverrideCursor()
 
+        thread = self.recalc_thread
+        assert thread is not None
+        ca, md = thread.jobs[0]
+        # Another archive may have been loaded since, its metadata is not the one that was calculated
+        if md is not None and ca is self.comic_archive:
+            self.metadata.pages = md.pages
+            self.metadata.page_count = md.page_count
+            self.page_list_editor.set_data(self.comic_archive, self.metadata.pages)
+            self.set_dirty_flag()
+
+        if len(thread.jobs) > 1 or thread.failed_list:
+            self.fileSelectionList.update_selected_rows()
+            self.update_info_box()
+            summary = f"Successfully recalculated the page dimensions of {thread.success_count} archive(s)."
+            if thread.failed_list:
+                summary += f"\n\nThe operation failed in the following {len(thread.failed_list)} archive(s):\n"
+                for f in thread.failed_list:
+                    summary += f"\t{f}\n"
+
+            dlg = LogWindow(self)
+            dlg.set_text(summary)
+            dlg.setWindowTitle("Recalculate Page Dimensions Summary")
+            dlg.exec()
+
     def rename_archive(self) -> None:
         ca_list = self.fileSelectionList.get_selected_archive_list()
 
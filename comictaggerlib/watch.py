@@ -0,0 +1,207 @@
+"""Watches folders for new or changed files"""
+
+#
+# Copyright 2012-2014 ComicTagger Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import pathlib
+import select
+import struct
+import sys
+import time
+from collections.abc import Iterable, Iterator
+
+from comicapi import utils
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+_event = struct.Struct("iIII")
+
+
+class Inotify:
+    """A minimal ctypes binding to the Linux inotify API, only available if is_available returns True"""
+
+    mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self) -> None:
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.watches: dict[int, str] = {}
+
+    @staticmethod
+    def is_available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"))
+            return hasattr(libc, "inotify_init1")
+        except OSError:
+            return False
+
+    def add_watch(self, folder: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), self.mask)
+        if wd < 0:
+            logger.error("Unable to watch %s: %s", folder, os.strerror(ctypes.get_errno()))
+            return
+        self.watches[wd] = folder
+
+    def read(self, timeout: float) -> Iterator[tuple[str, int]]:
+        """Yields the (path, mask) of every event received within timeout seconds"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        i = 0
+        while i + _event.size <= len(data):
+            wd, mask, _, length = _event.unpack_from(data, i)
+            name = data[i + _event.size : i + _event.size + length].rstrip(b"\0")
+            i += _event.size + length
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if mask & IN_Q_OVERFLOW:
+                yield "", mask
+                continue
+            if wd in self.watches:
+                yield os.path.join(self.watches[wd], os.fsdecode(name)), mask
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class Watcher:
+    """
+    Watches folders and their sub-folders, iterating yields lists of files that were added or changed.
+    A file is only yielded once its inode, size and mtime have not changed for settle seconds, so that files
+    that are still being copied are not processed.
+    Every file that already exists is yielded once when watching starts.
+
+    inotify is used on Linux, otherwise every folder is scanned for changes every poll_interval seconds.
+    """
+
+    def __init__(
+        self,
+        folders: Iterable[pathlib.Path],
+        settle: float = 5.0,
+        poll_interval: float = 10.0,
+        use_inotify: bool = True,
+    ) -> None:
+        self.folders = [str(folder) for folder in folders]
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.inotify: Inotify | None = None
+        if use_inotify and Inotify.is_available():
+            self.inotify = Inotify()
+        # path -> (inode, size, mtime_ns), time the key last changed
+        self.pending: dict[str, tuple[tuple[int, int, int] | None, float]] = {}
+        self.snapshot: dict[str, tuple[int, int, int]] = {}
+        self.next_poll = 0.0
+        self._add_folders(self.folders, settled=True)
+
+    def __enter__(self) -> Watcher:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+
+    def __iter__(self) -> Iterator[list[pathlib.Path]]:
+        while True:
+            ready = self.wait(min(1.0, self.settle))
+            if ready:
+                yield ready
+
+    def _add_folders(self, folders: Iterable[str], settled: bool = False) -> None:
+        """Watches folders and marks every file in them as pending, if settled they don't wait for settle seconds"""
+        now = time.monotonic() - self.settle if settled else time.monotonic()
+        for folder in folders:
+            if self.inotify is not None:
+                self.inotify.add_watch(folder)
+                for root, dirs, _ in os.walk(folder):
+                    for name in dirs:
+                        self.inotify.add_watch(os.path.join(root, name))
+            for path, st in utils.scan_files(folder):
+                key = (st.st_ino, st.st_size, st.st_mtime_ns)
+                self.snapshot[path] = key
+                self.pending[path] = (key, now)
+
+    def _poll(self) -> None:
+        snapshot = {}
+        for folder in self.folders:
+            for path, st in utils.scan_files(folder):
+                snapshot[path] = (st.st_ino, st.st_size, st.st_mtime_ns)
+                if self.snapshot.get(path) != snapshot[path] and path not in self.pending:
+                    self.pending[path] = (None, time.monotonic())
+        self.snapshot = snapshot
+
+    def wait(self, timeout: float) -> list[pathlib.Path]:
+        """Waits up to timeout seconds for changes and returns the files that have settled"""
+        if self.inotify is not None:
+            for path, mask in self.inotify.read(timeout):
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("Too many changes to track, rescanning %s", self.folders)
+                    self._add_folders(self.folders)
+                elif mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._add_folders([path])
+                else:
+                    self.pending[path] = (None, time.monotonic())
+        else:
+            time.sleep(timeout)
+            if time.monotonic() >= self.next_poll:
+                self.next_poll = time.monotonic() + self.poll_interval
+                self._poll()
+        return self._settled()
+
+    def _settled(self) -> list[pathlib.Path]:
+        ready = []
+        now = time.monotonic()
+        for path, (key, changed) in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Deleted or renamed, the new name has its own event
+                del self.pending[path]
+                continue
+            current = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if current != key:
+                self.pending[path] = (current, now)
+            elif now - changed >= self.settle:
+                del self.pending[path]
+                ready.append(pathlib.Path(path))
+        return sorted(ready)
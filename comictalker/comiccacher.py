@@ -21,10 +21,21 @@ import logging
 import os
 import pathlib
 import sqlite3
+import threading
+import weakref
+import zlib
+from collections.abc import Callable, Iterable
 from typing import Any
 
 from typing_extensions import NamedTuple
 
+try:
+    import zstandard
+
+    zstd_support = True
+except ImportError:
+    zstd_support = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -39,91 +50,254 @@ class Issue(NamedTuple):
     data: bytes
 
 
+_tables = {
+    "SeriesSearchCache": """CREATE TABLE SeriesSearchCache(
+        timestamp DATE DEFAULT (datetime('now','localtime')),
+        id          TEXT NOT NULL,
+        source      TEXT NOT NULL,
+        search_term TEXT,
+        PRIMARY KEY (id, source, search_term))""",
+    "Source": "CREATE TABLE Source(id TEXT NOT NULL, name TEXT NOT NULL, PRIMARY KEY (id))",
+    "Series": """CREATE TABLE Series(
+        timestamp DATE DEFAULT (datetime('now','localtime')),
+        id       TEXT NOT NULL,
+        source   TEXT NOT NULL,
+        data     BLOB,
+        complete BOOL,
+        PRIMARY KEY (id, source))""",
+    "Issues": """CREATE TABLE Issues(
+        timestamp DATE DEFAULT (datetime('now','localtime')),
+        id        TEXT NOT NULL,
+        source    TEXT NOT NULL,
+        series_id TEXT,
+        data      BLOB,
+        complete  BOOL,
+        PRIMARY KEY (id, source))""",
+}
+
+
+def _create_tables(cur: sqlite3.Cursor) -> None:
+    """
+    Creates the tables, caches from before the schema was versioned keep their tables
+    unless the columns are different
+    """
+    reference = sqlite3.connect(":memory:")
+    for table, sql in _tables.items():
+        expected = reference.execute(sql).execute(f"PRAGMA table_info({table})").fetchall()
+        existing = cur.execute(f"PRAGMA table_info({table})").fetchall()
+        if existing and existing != expected:
+            logger.info("Dropping cache table %s with an outdated schema", table)
+            cur.execute(f"DROP TABLE {table}")
+            existing = []
+        if not existing:
+            cur.execute(sql)
+    reference.close()
+
+
+def _create_indexes(cur: sqlite3.Cursor) -> None:
+    cur.execute("CREATE INDEX IF NOT EXISTS IssuesSeries ON Issues(series_id, source)")
+    cur.execute("CREATE INDEX IF NOT EXISTS SeriesSearchCacheTerm ON SeriesSearchCache(search_term, source)")
+    for table in ("SeriesSearchCache", "Series", "Issues"):
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}Timestamp ON {table}(timestamp)")
+
+
+def _add_compression(cur: sqlite3.Cursor) -> None:
+    # Existing payloads are left uncompressed, compression is NULL for them
+    cur.execute("ALTER TABLE Series ADD COLUMN compression TEXT")
+    cur.execute("ALTER TABLE Issues ADD COLUMN compression TEXT")
+
+
+# _migrations[n] migrates a cache from schema version n to n + 1,
+# a migration should only delete cached data when the payload format changes
+_migrations: list[Callable[[sqlite3.Cursor], None]] = [
+    _create_tables,
+    _create_indexes,
+    _add_compression,
+]
+SCHEMA_VERSION = len(_migrations)
+
+
+def compress(data: bytes | str) -> tuple[bytes, str]:
+    """Compresses data with zstd if it is available and zlib otherwise, returns the data and the compression used"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if zstd_support:
+        return zstandard.ZstdCompressor().compress(data), "zstd"
+    return zlib.compress(data), "zlib"
+
+
+def decompress(data: bytes, compression: str | None) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+def migrate(con: sqlite3.Connection) -> None:
+    """Applies the migrations the database at con is missing, the schema version is kept in PRAGMA user_version"""
+    with con:
+        cur = con.cursor()
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        for i, migration in enumerate(_migrations[version:], start=version):
+            logger.debug("Migrating the comic cache from schema version %d", i)
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {i + 1}")
+
+
+_cachers: dict[tuple[pathlib.Path, str], ComicCacher] = {}
+_cachers_lock = threading.Lock()
+
+
+def get_cacher(cache_folder: pathlib.Path, version: str) -> ComicCacher:
+    """Returns the ComicCacher for cache_folder shared by the whole process"""
+    with _cachers_lock:
+        if (cache_folder, version) not in _cachers:
+            _cachers[(cache_folder, version)] = ComicCacher(cache_folder, version)
+        return _cachers[(cache_folder, version)]
+
+
+def close_cachers() -> None:
+    """Closes every shared ComicCacher, they re-open the cache when next used"""
+    with _cachers_lock:
+        for cacher in _cachers.values():
+            cacher.close()
+
+
+class _ThreadConnection:
+    """Holds the connection of a thread, the connection is closed when the thread ends and this is collected"""
+
+    def __init__(self, con: sqlite3.Connection, generation: int) -> None:
+        self.con = con
+        self.generation = generation
+        self.release: weakref.finalize | None = None
+
+
 class ComicCacher:
+    """
+    Each thread uses a single connection while the thread is alive so that sqlite3 can re-use its prepared
+    statements, use get_cacher to share one cacher for the whole process.
+
+    Stale records are expired per table at most once every expire_interval instead of on every lookup.
+    """
+
+    ttls: dict[str, datetime.timedelta] = {
+        "SeriesSearchCache": datetime.timedelta(days=7),
+        "Series": datetime.timedelta(days=7),
+        "Issues": datetime.timedelta(days=7),
+    }
+    expire_interval = datetime.timedelta(hours=1)
+
     def __init__(self, cache_folder: pathlib.Path, version: str) -> None:
         self.cache_folder = cache_folder
         self.db_file = cache_folder / "comic_cache.db"
         self.version_file = cache_folder / "cache_version.txt"
         self.version = version
-
-        # verify that cache is from same version as this one
-        data = ""
-        try:
-            with open(self.version_file, "rb") as f:
-                data = f.read().decode("utf-8")
-                f.close()
-        except Exception:
-            pass
-        if data != version:
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._connections: list[sqlite3.Connection] = []
+        self._generation = 0
+        self._last_expired: dict[str, datetime.datetime] = {}
+        self.check_cache()
+
+    def check_cache(self) -> None:
+        """Creates the cache or migrates it to SCHEMA_VERSION, a cache from a newer schema is cleared"""
+        if os.path.exists(self.db_file) and self.schema_version() > SCHEMA_VERSION:
             self.clear_cache()
 
-        if not os.path.exists(self.db_file):
-            self.create_cache_db()
-
-    def clear_cache(self) -> None:
+        con = sqlite3.connect(self.db_file)
         try:
-            os.unlink(self.db_file)
-        except Exception:
-            pass
+            migrate(con)
+        finally:
+            con.close()
+
+        # the cache is no longer tied to the app version
         try:
             os.unlink(self.version_file)
         except Exception:
             pass
+        self._checked = True
 
-    def create_cache_db(self) -> None:
-        # create the version file
-        with open(self.version_file, "w", encoding="utf-8") as f:
-            f.write(self.version)
-
-        # this will wipe out any existing version
-        open(self.db_file, "wb").close()
-
+    def schema_version(self) -> int:
         con = sqlite3.connect(self.db_file)
-        con.row_factory = sqlite3.Row
-
-        # create tables
-        with con:
-            cur = con.cursor()
-            cur.execute(
-                """CREATE TABLE SeriesSearchCache(
-                timestamp DATE DEFAULT (datetime('now','localtime')),
-                id          TEXT NOT NULL,
-                source      TEXT NOT NULL,
-                search_term TEXT,
-                PRIMARY KEY (id, source, search_term))"""
-            )
-            cur.execute("CREATE TABLE Source(id TEXT NOT NULL, name TEXT NOT NULL, PRIMARY KEY (id))")
-
-            cur.execute(
-                """CREATE TABLE Series(
-                timestamp DATE DEFAULT (datetime('now','localtime')),
-                id       TEXT NOT NULL,
-                source   TEXT NOT NULL,
-                data     BLOB,
-                complete BOOL,
-                PRIMARY KEY (id, source))"""
-            )
-
-            cur.execute(
-                """CREATE TABLE Issues(
-                timestamp DATE DEFAULT (datetime('now','localtime')),
-                id        TEXT NOT NULL,
-                source    TEXT NOT NULL,
-                series_id TEXT,
-                data      BLOB,
-                complete  BOOL,
-                PRIMARY KEY (id, source))"""
-            )
+        try:
+            return con.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        holder: _ThreadConnection | None = getattr(self._local, "holder", None)
+        if holder is not None:
+            if holder.generation == self._generation:
+                return holder.con
+            # the cache was closed since this thread connected
+            self._close_thread_connection()
+        with self._lock:
+            if not self._checked:
+                self.check_cache()
+            # the finalizer can run on any thread
+            con = sqlite3.connect(self.db_file, check_same_thread=False)
+            con.row_factory = sqlite3.Row
+            con.text_factory = str
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("PRAGMA mmap_size=268435456")
+            self._connections.append(con)
+            holder = _ThreadConnection(con, self._generation)
+        # thread-local values are released when the thread ends eg the QThreads the GUI starts for every search
+        holder.release = weakref.finalize(holder, self._release, con)
+        self._local.holder = holder
+        return con
+
+    def _release(self, con: sqlite3.Connection) -> None:
+        with self._lock:
+            if con in self._connections:
+                self._connections.remove(con)
+        con.close()
+
+    def _close_thread_connection(self) -> None:
+        holder: _ThreadConnection | None = getattr(self._local, "holder", None)
+        self._local.holder = None
+        if holder is not None and holder.release is not None:
+            holder.release()
+
+    def close(self) -> None:
+        """
+        Closes the connection of the calling thread, other threads may still be using their connection.
+        They re-connect on their next use and their old connection is closed then or when the thread ends.
+        """
+        with self._lock:
+            self._generation += 1
+            self._close_thread_connection()
+            self._last_expired.clear()
+            self._checked = False
 
-    def expire_stale_records(self, cur: sqlite3.Cursor, table: str) -> None:
-        # purge stale series info
-        a_week_ago = datetime.datetime.today() - datetime.timedelta(days=7)
-        cur.execute("DELETE FROM Series WHERE timestamp  < ?", [str(a_week_ago)])
+    def clear_cache(self) -> None:
+        self.close()
+        for path in (self.db_file, self.version_file):
+            try:
+                os.unlink(path)
+            except Exception:
+                pass
+        for suffix in ("-wal", "-shm"):
+            try:
+                os.unlink(str(self.db_file) + suffix)
+            except Exception:
+                pass
+
+    def expire_stale_records(self, cur: sqlite3.Cursor, table: str, force: bool = False) -> None:
+        """Deletes the records in table older than its ttl, unless table was already expired this expire_interval"""
+        now = datetime.datetime.today()
+        with self._lock:
+            last_expired = self._last_expired.get(table)
+            if not force and last_expired is not None and now - last_expired < self.expire_interval:
+                return
+            self._last_expired[table] = now
+        cur.execute(f"DELETE FROM {table} WHERE timestamp < ?", [str(now - self.ttls[table])])
 
     def add_search_results(self, source: str, search_term: str, series_list: list[Series], complete: bool) -> None:
-        with sqlite3.connect(self.db_file) as con:
-            con.row_factory = sqlite3.Row
-            con.text_factory = str
+        con = self._connect()
+        with con:
             cur = con.cursor()
 
             # remove all previous entries with this search term
@@ -133,52 +307,58 @@ class ComicCacher:
             )
 
             # now add in new results
-            for series in series_list:
-                cur.execute(
-                    "INSERT INTO SeriesSearchCache (source, search_term, id) VALUES(?, ?, ?)",
-                    (source, search_term.casefold(), series.id),
-                )
-                data = {
-                    "id": series.id,
-                    "source": source,
-                    "data": series.data,
-                    "complete": complete,
-                }
-                self.upsert(cur, "series", data)
+            cur.executemany(
+                "INSERT INTO SeriesSearchCache (source, search_term, id) VALUES(?, ?, ?)",
+                [(source, search_term.casefold(), series.id) for series in series_list],
+            )
+            self.upsert_many(
+                cur,
+                "series",
+                [
+                    {"id": series.id, "source": source, **self._payload(series.data), "complete": complete}
+                    for series in series_list
+                ],
+            )
 
     def add_series_info(self, source: str, series: Series, complete: bool) -> None:
-        with sqlite3.connect(self.db_file) as con:
-            con.row_factory = sqlite3.Row
-            cur = con.cursor()
+        self.add_series_info_many(source, [series], complete)
 
-            data = {
-                "id": series.id,
-                "source": source,
-                "data": series.data,
-                "complete": complete,
-            }
-            self.upsert(cur, "series", data)
+    def add_series_info_many(self, source: str, series_list: list[Series], complete: bool) -> None:
+        con = self._connect()
+        with con:
+            cur = con.cursor()
+            self.upsert_many(
+                cur,
+                "series",
+                [
+                    {"id": series.id, "source": source, **self._payload(series.data), "complete": complete}
+                    for series in series_list
+                ],
+            )
 
     def add_issues_info(self, source: str, issues: list[Issue], complete: bool) -> None:
-        with sqlite3.connect(self.db_file) as con:
-            con.row_factory = sqlite3.Row
+        con = self._connect()
+        with con:
             cur = con.cursor()
-
-            for issue in issues:
-                data = {
-                    "id": issue.id,
-                    "series_id": issue.series_id,
-                    "data": issue.data,
-                    "source": source,
-                    "complete": complete,
-                }
-                self.upsert(cur, "issues", data)
+            self.upsert_many(
+                cur,
+                "issues",
+                [
+                    {
+                        "id": issue.id,
+                        "series_id": issue.series_id,
+                        **self._payload(issue.data),
+                        "source": source,
+                        "complete": complete,
+                    }
+                    for issue in issues
+                ],
+            )
 
     def get_search_results(self, source: str, search_term: str, expire_stale: bool = True) -> list[tuple[Series, bool]]:
         results = []
-        with sqlite3.connect(self.db_file) as con:
-            con.row_factory = sqlite3.Row
-            con.text_factory = str
+        con = self._connect()
+        with con:
             cur = con.cursor()
 
             if expire_stale:
@@ -195,40 +375,41 @@ class ComicCacher:
             rows = cur.fetchall()
 
             for record in rows:
-                result = Series(id=record["id"], data=record["data"])
+                result = Series(id=record["id"], data=decompress(record["data"], record["compression"]))
 
                 results.append((result, record["complete"]))
 
         return results
 
     def get_series_info(self, series_id: str, source: str, expire_stale: bool = True) -> tuple[Series, bool] | None:
-        with sqlite3.connect(self.db_file) as con:
-            con.row_factory = sqlite3.Row
+        return next(iter(self.get_series_info_many([series_id], source, expire_stale).values()), None)
+
+    def get_series_info_many(
+        self, series_ids: Iterable[str], source: str, expire_stale: bool = True
+    ) -> dict[str, tuple[Series, bool]]:
+        """Returns the cached series of series_ids by id, series that are not cached are left out"""
+        results: dict[str, tuple[Series, bool]] = {}
+        con = self._connect()
+        with con:
             cur = con.cursor()
-            con.text_factory = str
 
             if expire_stale:
                 self.expire_stale_records(cur, "Series")
 
-            # fetch
-            cur.execute("SELECT * FROM Series WHERE id=? AND source=?", [series_id, source])
-
-            row = cur.fetchone()
-
-            if row is None:
-                return None
-
-            result = Series(id=row["id"], data=row["data"])
+            for row in self._select_many(cur, "Series", "id", series_ids, source):
+                results[row["id"]] = (
+                    Series(id=row["id"], data=decompress(row["data"], row["compression"])),
+                    row["complete"],
+                )
 
-            return (result, row["complete"])
+        return results
 
     def get_series_issues_info(
         self, series_id: str, source: str, expire_stale: bool = True
     ) -> list[tuple[Issue, bool]]:
-        with sqlite3.connect(self.db_file) as con:
-            con.row_factory = sqlite3.Row
+        con = self._connect()
+        with con:
             cur = con.cursor()
-            con.text_factory = str
 
             if expire_stale:
                 self.expire_stale_records(cur, "Issues")
@@ -241,63 +422,96 @@ class ComicCacher:
 
             # now process the results
             for row in rows:
-                record = (Issue(id=row["id"], series_id=row["series_id"], data=row["data"]), row["complete"])
+                record = (
+                    Issue(id=row["id"], series_id=row["series_id"], data=decompress(row["data"], row["compression"])),
+                    row["complete"],
+                )
 
                 results.append(record)
 
         return results
 
     def get_issue_info(self, issue_id: str, source: str, expire_stale: bool = True) -> tuple[Issue, bool] | None:
-        with sqlite3.connect(self.db_file) as con:
-            con.row_factory = sqlite3.Row
+        return next(iter(self.get_issue_info_many([issue_id], source, expire_stale).values()), None)
+
+    def get_issue_info_many(
+        self, issue_ids: Iterable[str], source: str, expire_stale: bool = True
+    ) -> dict[str, tuple[Issue, bool]]:
+        """Returns the cached issues of issue_ids by id, issues that are not cached are left out"""
+        results: dict[str, tuple[Issue, bool]] = {}
+        con = self._connect()
+        with con:
             cur = con.cursor()
-            con.text_factory = str
 
             if expire_stale:
                 self.expire_stale_records(cur, "Issues")
 
-            cur.execute("SELECT * FROM Issues WHERE id=? AND source=?", [issue_id, source])
-            row = cur.fetchone()
-
-            record = None
+            for row in self._select_many(cur, "Issues", "id", issue_ids, source):
+                results[row["id"]] = (
+                    Issue(id=row["id"], series_id=row["series_id"], data=decompress(row["data"], row["compression"])),
+                    row["complete"],
+                )
 
-            if row:
-                record = (Issue(id=row["id"], series_id=row["series_id"], data=row["data"]), row["complete"])
+        return results
 
-            return record
+    def _select_many(
+        self, cur: sqlite3.Cursor, tablename: str, column: str, values: Iterable[str], source: str
+    ) -> list[sqlite3.Row]:
+        """Selects the rows where column is any of values, in chunks to stay under SQLite's parameter limit"""
+        values = list(dict.fromkeys(values))
+        rows: list[sqlite3.Row] = []
+        for i in range(0, len(values), 500):
+            chunk = values[i : i + 500]
+            cur.execute(
+                f"SELECT * FROM {tablename} WHERE source=? AND {column} IN ({', '.join('?' * len(chunk))})",
+                [source, *chunk],
+            )
+            rows.extend(cur.fetchall())
+        return rows
+
+    def _payload(self, data: bytes) -> dict[str, Any]:
+        data, compression = compress(data)
+        return {"data": data, "compression": compression}
+
+    def stats(self) -> dict[str, int]:
+        """Returns the row count of each table, the size of the stored payloads and the size of the cache on disk"""
+        con = self._connect()
+        stats: dict[str, int] = {}
+        for table in ("SeriesSearchCache", "Series", "Issues"):
+            stats[table] = con.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        stats["payload_size"] = sum(
+            con.execute(f"SELECT coalesce(sum(length(data)), 0) FROM {table}").fetchone()[0]
+            for table in ("Series", "Issues")
+        )
+        stats["db_size"] = sum(
+            os.path.getsize(path) for path in (self.db_file, str(self.db_file) + "-wal") if os.path.exists(path)
+        )
+        return stats
 
     def upsert(self, cur: sqlite3.Cursor, tablename: str, data: dict[str, Any]) -> None:
         """This does an insert if the given PK doesn't exist, and an
         update it if does
-
-        TODO: should the cursor be created here, and not up the stack?
         """
+        self.upsert_many(cur, tablename, [data])
 
-        keys = ""
-        vals = []
-        ins_slots = ""
-        set_slots = ""
-
-        for key in data:
-            if data[key] is None:
-                continue
-
-            if keys != "":
-                keys += ", "
-            if ins_slots != "":
-                ins_slots += ", "
-            if set_slots != "":
-                set_slots += ", "
-
-            keys += key
-            vals.append(data[key])
-            ins_slots += "?"
-            set_slots += key + " = ?"
-
-        sql_ins = f"INSERT OR REPLACE INTO {tablename} ({keys}) VALUES ({ins_slots})"
-        if not data.get("complete", True):
-            sql_ins += f" ON CONFLICT DO UPDATE SET {set_slots} WHERE complete != ?"
-            vals.extend(vals)
-            vals.append(True)  # If the cache is complete and this isn't complete we don't update it
-
-        cur.execute(sql_ins, vals)
+    def upsert_many(self, cur: sqlite3.Cursor, tablename: str, rows: Iterable[dict[str, Any]]) -> None:
+        """
+        Upserts every row, rows that set the same columns are written with a single executemany.
+        Columns that are None are not set and incomplete rows don't replace complete ones.
+        """
+        groups: dict[tuple[tuple[str, ...], bool], list[list[Any]]] = {}
+        for data in rows:
+            keys = tuple(key for key in data if data[key] is not None)
+            vals = [data[key] for key in keys]
+            complete = bool(data.get("complete", True))
+            if not complete:
+                vals.extend(vals)
+                vals.append(True)  # If the cache is complete and this isn't complete we don't update it
+            groups.setdefault((keys, complete), []).append(vals)
+
+        for (keys, complete), params in groups.items():
+            sql_ins = f"INSERT OR REPLACE INTO {tablename} ({', '.join(keys)}) VALUES ({', '.join('?' * len(keys))})"
+            if not complete:
+                set_slots = ", ".join(f"{key} = ?" for key in keys)
+                sql_ins += f" ON CONFLICT DO UPDATE SET {set_slots} WHERE complete != ?"
+            cur.executemany(sql_ins, params)
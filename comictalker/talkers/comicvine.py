@@ -35,7 +35,7 @@ from comicapi.genericmetadata import ComicSeries, GenericMetadata, MetadataOrigi
 from comicapi.issuestring import IssueString
 from comicapi.utils import LocationParseError, parse_url
 from comictalker import talker_utils
-from comictalker.comiccacher import ComicCacher, Issue, Series
+from comictalker.comiccacher import Issue, Series, get_cacher
 from comictalker.comictalker import ComicTalker, TalkerDataError, TalkerNetworkError
 
 try:
@@ -160,6 +160,30 @@ class CVResult(TypedDict, Generic[T]):
 
 # https://comicvine.gamespot.com/forums/api-developers-2334/api-rate-limiting-1746419/
 # "Space out your requests so AT LEAST one second passes between each and you can make requests all day."
+# The fields used by _format_series and _map_comic_issue_to_metadata, the rest are not cached
+_cached_series_fields = frozenset(
+    {"id", "name", "aliases", "count_of_issues", "description", "image", "publisher", "start_year"}
+)
+_cached_issue_fields = frozenset(
+    {
+        "id",
+        "volume",
+        "issue_number",
+        "name",
+        "aliases",
+        "description",
+        "image",
+        "associated_images",
+        "cover_date",
+        "site_detail_url",
+        "character_credits",
+        "location_credits",
+        "team_credits",
+        "story_arc_credits",
+        "person_credits",
+    }
+)
+
 custom_limiter = Limiter(RequestRate(10, 10), RequestRate(200, 1 * 60 * 60))
 default_limiter = Limiter(RequestRate(1, 10), RequestRate(100, 1 * 60 * 60))
 
@@ -186,6 +210,7 @@ class ComicVineTalker(ComicTalker):
         self.default_api_url = self.api_url = f"{self.website}/api/"
         self.default_api_key = self.api_key = "27431e6787042105bd3e47e169a624521f89f3a4"
         self.use_series_start_as_volume: bool = False
+        self.cache_all_fields: bool = False
         self.total_requests_made: dict[str, int] = defaultdict(int)
         self.custom_url_parameters: dict[str, str] = {}
 
@@ -200,6 +225,13 @@ class ComicVineTalker(ComicTalker):
             display_name="Use series start as volume",
             help="Use the series start year as the volume number",
         )
+        parser.add_setting(
+            "--cv-cache-all-fields",
+            default=False,
+            action=argparse.BooleanOptionalAction,
+            display_name="Cache all fields",
+            help="Cache the full Comic Vine response instead of only the fields that are used",
+        )
 
         # The default needs to be unset or None.
         # This allows this setting to be unset with the empty string, allowing the default to change
@@ -223,6 +255,7 @@ class ComicVineTalker(ComicTalker):
         settings = super().parse_settings(settings)
 
         self.use_series_start_as_volume = settings["cv_use_series_start_as_volume"]
+        self.cache_all_fields = settings["cv_cache_all_fields"]
 
         self.custom_url_parameters = dict(parse_qsl(settings[f"{self.id}_custom_parameters"]))
 
@@ -282,7 +315,7 @@ class ComicVineTalker(ComicTalker):
 
         # Before we search online, look in our cache, since we might have done this same search recently
         # For literal searches always retrieve from online
-        cvc = ComicCacher(self.cache_folder, self.version)
+        cvc = get_cacher(self.cache_folder, self.version)
         if not refresh_cache and not literal:
             cached_search_results = cvc.get_search_results(self.id, series_name)
 
@@ -362,7 +395,7 @@ class ComicVineTalker(ComicTalker):
         cvc.add_search_results(
             self.id,
             series_name,
-            [Series(id=str(x["id"]), data=json.dumps(x).encode("utf-8")) for x in search_results],
+            [Series(id=str(x["id"]), data=self._cache_payload(_cached_series_fields, x)) for x in search_results],
             False,
         )
 
@@ -390,11 +423,12 @@ class ComicVineTalker(ComicTalker):
     ) -> list[GenericMetadata]:
         logger.debug("Fetching comics by series ids: %s and number: %s", series_id_list, issue_number)
         # before we search online, look in our cache, since we might already have this info
-        cvc = ComicCacher(self.cache_folder, self.version)
-        cached_results: list[GenericMetadata] = []
+        cvc = get_cacher(self.cache_folder, self.version)
+        cached_issues: list[CVIssue] = []
         needed_volumes: set[int] = set()
+        cached_series = cvc.get_series_info_many([str(x) for x in series_id_list], self.id, expire_stale=False)
         for series_id in series_id_list:
-            series = cvc.get_series_info(series_id, self.id, expire_stale=False)
+            series = cached_series.get(str(series_id))
             issues = []
             # Explicitly mark count_of_issues at an impossible value
             cvseries = CVSeries(id=int(series_id), count_of_issues=-1)
@@ -405,12 +439,7 @@ class ComicVineTalker(ComicTalker):
             for issue, _ in issues:
                 cvissue = cast(CVIssue, json.loads(issue.data))
                 if cvissue.get("issue_number") == issue_number:
-                    cached_results.append(
-                        self._map_comic_issue_to_metadata(
-                            cvissue,
-                            self._fetch_series([int(cvissue["volume"]["id"])])[0][0],
-                        ),
-                    )
+                    cached_issues.append(cvissue)
                     issue_found = True
                     break
             if not issues:
@@ -420,9 +449,9 @@ class ComicVineTalker(ComicTalker):
             if (not issue_found) and cvseries.get("count_of_issues") != len(issues):
                 needed_volumes.add(int(series_id))
 
-        logger.debug("Found %d issues cached need %d issues", len(cached_results), len(needed_volumes))
+        logger.debug("Found %d issues cached need %d issues", len(cached_issues), len(needed_volumes))
         if not needed_volumes:
-            return cached_results
+            return self._map_comic_issues_to_metadata(cached_issues)
 
         series_filter = ""
         for vid in needed_volumes:
@@ -463,42 +492,32 @@ class ComicVineTalker(ComicTalker):
         cvc.add_issues_info(
             self.id,
             [
-                Issue(str(x["id"]), str(x["volume"]["id"]), json.dumps(x).encode("utf-8"))
+                Issue(str(x["id"]), str(x["volume"]["id"]), self._cache_payload(_cached_issue_fields, x))
                 for x in filtered_issues_result
             ],
             False,
         )
 
-        formatted_filtered_issues_result = [
-            self._map_comic_issue_to_metadata(x, self._fetch_series_data(x["volume"]["id"])[0])
-            for x in filtered_issues_result
-        ]
-        formatted_filtered_issues_result.extend(cached_results)
-
-        return formatted_filtered_issues_result
+        return self._map_comic_issues_to_metadata(filtered_issues_result + cached_issues)
 
     def fetch_comics(self, *, issue_ids: list[str]) -> list[GenericMetadata]:
         logger.debug("Fetching comic IDs: %s", issue_ids)
         # before we search online, look in our cache, since we might already have this info
-        cvc = ComicCacher(self.cache_folder, self.version)
-        cached_results: list[GenericMetadata] = []
+        cvc = get_cacher(self.cache_folder, self.version)
+        cached_issues: list[CVIssue] = []
         needed_issues: list[int] = []
+        cached = cvc.get_issue_info_many([str(x) for x in issue_ids], self.id)
         for issue_id in issue_ids:
-            cached_issue = cvc.get_issue_info(issue_id, self.id)
+            cached_issue = cached.get(str(issue_id))
 
             if cached_issue and cached_issue[1]:
-                cached_results.append(
-                    self._map_comic_issue_to_metadata(
-                        json.loads(cached_issue[0].data),
-                        self._fetch_series([int(cached_issue[0].series_id)])[0][0],
-                    ),
-                )
+                cached_issues.append(json.loads(cached_issue[0].data))
             else:
                 needed_issues.append(int(issue_id))  # CV uses integers for it's IDs
 
-        logger.debug("Found %d issues cached need %d issues", len(cached_results), len(needed_issues))
+        logger.debug("Found %d issues cached need %d issues", len(cached_issues), len(needed_issues))
         if not needed_issues:
-            return cached_results
+            return self._map_comic_issues_to_metadata(cached_issues)
 
         issue_filter = ""
         for iid in needed_issues:
@@ -530,33 +549,39 @@ class ComicVineTalker(ComicTalker):
             issue_results.extend(cv_response["results"])
             current_result_count += cv_response["number_of_page_results"]
 
-        series_info = {s[0].id: s[0] for s in self._fetch_series([int(i["volume"]["id"]) for i in issue_results])}
+        cvc.add_issues_info(
+            self.id,
+            [
+                Issue(
+                    id=str(issue["id"]),
+                    series_id=str(issue["volume"]["id"]),
+                    data=self._cache_payload(_cached_issue_fields, issue),
+                )
+                for issue in issue_results
+            ],
+            False,  # The /issues/ endpoint never provides credits
+        )
 
-        for issue in issue_results:
-            cvc.add_issues_info(
-                self.id,
-                [
-                    Issue(
-                        id=str(issue["id"]),
-                        series_id=str(issue["volume"]["id"]),
-                        data=json.dumps(issue).encode("utf-8"),
-                    ),
-                ],
-                False,  # The /issues/ endpoint never provides credits
-            )
-            cached_results.append(
-                self._map_comic_issue_to_metadata(issue, series_info[str(issue["volume"]["id"])]),
-            )
+        return self._map_comic_issues_to_metadata(cached_issues + issue_results)
 
-        return cached_results
+    def _cache_payload(self, fields: frozenset[str], record: CVIssue | CVSeries) -> bytes:
+        if self.cache_all_fields:
+            return json.dumps(record).encode("utf-8")
+        return json.dumps({k: v for k, v in record.items() if k in fields}).encode("utf-8")
+
+    def _map_comic_issues_to_metadata(self, issues: list[CVIssue]) -> list[GenericMetadata]:
+        """Maps issues to GenericMetadata, fetching all of their series at once"""
+        series_info = {s[0].id: s[0] for s in self._fetch_series([int(i["volume"]["id"]) for i in issues])}
+        return [self._map_comic_issue_to_metadata(issue, series_info[str(issue["volume"]["id"])]) for issue in issues]
 
     def _fetch_series(self, series_ids: list[int]) -> list[tuple[ComicSeries, bool]]:
         # before we search online, look in our cache, since we might already have this info
-        cvc = ComicCacher(self.cache_folder, self.version)
+        cvc = get_cacher(self.cache_folder, self.version)
         cached_results: list[tuple[ComicSeries, bool]] = []
         needed_series: list[int] = []
-        for series_id in series_ids:
-            cached_series = cvc.get_series_info(str(series_id), self.id)
+        cached = cvc.get_series_info_many([str(series_id) for series_id in series_ids], self.id)
+        for series_id in dict.fromkeys(series_ids):
+            cached_series = cached.get(str(series_id))
             if cached_series is not None:
                 cached_results.append((self._format_series(json.loads(cached_series[0].data)), cached_series[1]))
             else:
@@ -595,14 +620,15 @@ class ComicVineTalker(ComicTalker):
             series_results.extend(cv_response["results"])
             current_result_count += cv_response["number_of_page_results"]
 
-        if series_results:
-            for series in series_results:
-                cvc.add_series_info(
-                    self.id,
-                    Series(id=str(series["id"]), data=json.dumps(series).encode("utf-8")),
-                    True,
-                )
-                cached_results.append((self._format_series(series), True))
+        cvc.add_series_info_many(
+            self.id,
+            [
+                Series(id=str(series["id"]), data=self._cache_payload(_cached_series_fields, series))
+                for series in series_results
+            ],
+            True,
+        )
+        cached_results.extend((self._format_series(series), True) for series in series_results)
 
         return cached_results
 
@@ -712,7 +738,7 @@ class ComicVineTalker(ComicTalker):
     def _fetch_issues_in_series(self, series_id: str) -> list[tuple[GenericMetadata, bool]]:
         logger.debug("Fetching all issues in series: %s", series_id)
         # before we search online, look in our cache, since we might already have this info
-        cvc = ComicCacher(self.cache_folder, self.version)
+        cvc = get_cacher(self.cache_folder, self.version)
         cached_results = cvc.get_series_issues_info(series_id, self.id)
 
         series = self._fetch_series_data(int(series_id))[0]
@@ -751,15 +777,12 @@ class ComicVineTalker(ComicTalker):
             series_issues_result.extend(cv_response["results"])
             current_result_count += cv_response["number_of_page_results"]
         # Format to expected output
-        formatted_series_issues_result = [
-            self._map_comic_issue_to_metadata(x, self._fetch_series_data(x["volume"]["id"])[0])
-            for x in series_issues_result
-        ]
+        formatted_series_issues_result = [self._map_comic_issue_to_metadata(x, series) for x in series_issues_result]
 
         cvc.add_issues_info(
             self.id,
             [
-                Issue(id=str(x["id"]), series_id=series_id, data=json.dumps(x).encode("utf-8"))
+                Issue(id=str(x["id"]), series_id=series_id, data=self._cache_payload(_cached_issue_fields, x))
                 for x in series_issues_result
             ],
             False,
@@ -769,7 +792,7 @@ class ComicVineTalker(ComicTalker):
     def _fetch_series_data(self, series_id: int) -> tuple[ComicSeries, bool]:
         logger.debug("Fetching series info: %s", series_id)
         # before we search online, look in our cache, since we might already have this info
-        cvc = ComicCacher(self.cache_folder, self.version)
+        cvc = get_cacher(self.cache_folder, self.version)
         cached_series = cvc.get_series_info(str(series_id), self.id)
 
         logger.debug("Series cached: %s", bool(cached_series))
@@ -788,7 +811,9 @@ class ComicVineTalker(ComicTalker):
 
         if series_results:
             cvc.add_series_info(
-                self.id, Series(id=str(series_results["id"]), data=json.dumps(series_results).encode("utf-8")), True
+                self.id,
+                Series(id=str(series_results["id"]), data=self._cache_payload(_cached_series_fields, series_results)),
+                True,
             )
 
         return self._format_series(series_results), True
@@ -817,7 +842,7 @@ class ComicVineTalker(ComicTalker):
     def _fetch_issue_data_by_issue_id(self, issue_id: str) -> GenericMetadata:
         logger.debug("Fetching issue by issue ID: %s", issue_id)
         # before we search online, look in our cache, since we might already have this info
-        cvc = ComicCacher(self.cache_folder, self.version)
+        cvc = get_cacher(self.cache_folder, self.version)
         cached_issue = cvc.get_issue_info(issue_id, self.id)
 
         logger.debug("Issue cached: %s", bool(cached_issue and cached_issue[1]))
@@ -838,7 +863,7 @@ class ComicVineTalker(ComicTalker):
                 Issue(
                     id=str(issue_results["id"]),
                     series_id=str(issue_results["volume"]["id"]),
-                    data=json.dumps(issue_results).encode("utf-8"),
+                    data=self._cache_payload(_cached_issue_fields, issue_results),
                 )
             ],
             True,
@@ -1,13 +1,21 @@
 from __future__ import annotations
 
+import io
+import logging
+import os
 import pathlib
 import platform
 import shutil
+import subprocess
+import threading
+import zipfile
 
+import PIL.Image
 import pytest
 from importlib_metadata import entry_points
 
 import comicapi.archivers.rar
+import comicapi.archivers.sevenzip
 import comicapi.archivers.zip
 import comicapi.comicarchive
 import comicapi.genericmetadata
@@ -79,7 +87,8 @@ def test_page_type_write(tmp_comic):
     md = tmp_comic.read_tags("cr")
 
 
-def test_invalid_zip(tmp_comic: comicapi.comicarchive.ComicArchive):
+def test_invalid_zip(tmp_comic: comicapi.comicarchive.ComicArchive, monkeypatch):
+    monkeypatch.setattr(comicapi.comicarchive.ComicArchive, "validation", comicapi.comicarchive.Validation.FULL)
     with open(tmp_comic.path, mode="b+r") as f:
         # This only corrupts the first file. If it is never read then no exception will be caused
         f.write(b"PK\000\000")
@@ -139,3 +148,484 @@ def test_rename_ro_dest(tmp_comic, tmp_path):
     assert old_path.exists()
     assert tmp_comic.path.exists()
     assert tmp_comic.path == old_path
+
+
+def test_zip_session(tmp_path):
+    comic_path = tmp_path / "session.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        zf.writestr("page1.jpg", b"page 1")
+        zf.writestr("page2.jpg", b"page 2")
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+
+    with ca:
+        assert ca.get_page(0) == b"page 1"
+        zf = ca.archiver._zf
+        assert zf is not None
+        assert ca.get_page(1) == b"page 2"
+        assert ca.archiver._zf is zf
+
+        # Writing invalidates the open handle
+        assert ca.archiver.write_file("page1.jpg", b"new page 1")
+        assert ca.archiver._zf is None
+        assert ca.get_page(0) == b"new page 1"
+    assert ca.archiver._zf is None
+
+
+def test_zip_session_closed_while_reading(tmp_path):
+    comic_path = tmp_path / "session.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        zf.writestr("page1.jpg", b"page 1")
+    archiver = comicapi.comicarchive.ComicArchive(comic_path).archiver
+
+    archiver.open_session()
+    with archiver._reader() as zf:
+        closer = threading.Thread(target=archiver.close_session)
+        closer.start()
+        closer.join(0.2)
+        # The session is only closed once the read finishes
+        assert closer.is_alive()
+        assert zf.read("page1.jpg") == b"page 1"
+    closer.join()
+    assert archiver._zf is None
+    assert zf.fp is None
+
+
+def test_zip_validation(tmp_path, monkeypatch):
+    comic_path = tmp_path / "corrupt.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        zf.writestr("page1.jpg", b"page 1")
+        zf.writestr("page2.jpg", b"page 2")
+    data = comic_path.read_bytes()
+    # Corrupt the data of the first page, the central directory is still valid
+    comic_path.write_bytes(data.replace(b"page 1", b"PAGE 1", 1))
+
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    assert ca.seems_to_be_a_comic_archive()
+    assert not ca.verify()
+
+    monkeypatch.setattr(comicapi.comicarchive.ComicArchive, "validation", comicapi.comicarchive.Validation.FULL)
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    assert not ca.seems_to_be_a_comic_archive()
+
+
+def test_zip_rebuild_raw_copy(tmp_path):
+    comic_path = tmp_path / "rebuild.cbz"
+    with zipfile.ZipFile(comic_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("ComicInfo.xml", b"<ComicInfo/>")
+        zf.writestr("page1.jpg", b"page 1" * 100)
+        zf.writestr("page2.jpg", b"page 2" * 100, compress_type=zipfile.ZIP_STORED)
+        zf.comment = b"comment"
+    with zipfile.ZipFile(comic_path) as zf:
+        original = {info.filename: (info.compress_type, info.compress_size, info.CRC) for info in zf.infolist()}
+    del original["ComicInfo.xml"]
+
+    archiver = comicapi.archivers.zip.ZipArchiver.open(comic_path)
+    assert archiver.remove_file("ComicInfo.xml")
+
+    with zipfile.ZipFile(comic_path) as zf:
+        assert zf.testzip() is None
+        assert zf.comment == b"comment"
+        assert {info.filename: (info.compress_type, info.compress_size, info.CRC) for info in zf.infolist()} == original
+    assert archiver.read_file("page1.jpg") == b"page 1" * 100
+
+
+def test_zip_write_tail_placement(tmp_path):
+    comic_path = tmp_path / "tail.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        zf.writestr("ComicInfo.xml", b"<ComicInfo/>")
+        zf.writestr("page1.jpg", b"page 1" * 100)
+        zf.writestr("page2.jpg", b"page 2" * 100)
+
+    archiver = comicapi.archivers.zip.ZipArchiver.open(comic_path)
+    # The first write moves ComicInfo.xml to the end of the archive
+    assert archiver.write_file("ComicInfo.xml", b"<ComicInfo>1</ComicInfo>")
+    with zipfile.ZipFile(comic_path) as zf:
+        assert zf.infolist()[-1].filename == "ComicInfo.xml"
+        pages_offset = zf.getinfo("ComicInfo.xml").header_offset
+    pages = comic_path.read_bytes()[:pages_offset]
+
+    # Later writes leave the pages where they are
+    assert archiver.write_file("ComicInfo.xml", b"<ComicInfo>2</ComicInfo>")
+    with zipfile.ZipFile(comic_path) as zf:
+        assert zf.testzip() is None
+        assert zf.getinfo("ComicInfo.xml").header_offset == pages_offset
+        assert [x.filename for x in zf.infolist()] == ["page1.jpg", "page2.jpg", "ComicInfo.xml"]
+    assert comic_path.read_bytes()[:pages_offset] == pages
+    assert archiver.read_file("ComicInfo.xml") == b"<ComicInfo>2</ComicInfo>"
+
+
+def test_zip_write_files(tmp_path):
+    comic_path = tmp_path / "write_files.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        zf.writestr("ComicInfo.xml", b"<ComicInfo/>")
+        zf.writestr("page1.jpg", b"page 1")
+
+    archiver = comicapi.archivers.zip.ZipArchiver.open(comic_path)
+    assert archiver.write_files({"ComicInfo.xml": b"<ComicInfo>1</ComicInfo>", "other.txt": b"other"}, "comment")
+
+    with zipfile.ZipFile(comic_path) as zf:
+        assert zf.testzip() is None
+        assert [x.filename for x in zf.infolist()] == ["page1.jpg", "ComicInfo.xml", "other.txt"]
+    assert archiver.get_comment() == "comment"
+    assert archiver.read_file("ComicInfo.xml") == b"<ComicInfo>1</ComicInfo>"
+
+
+def test_write_tags_batched(tmp_path, md_saved, monkeypatch):
+    comic_path = tmp_path / "batched.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        zf.writestr("page1.jpg", b"page 1")
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+
+    written = []
+    write_files = ca.archiver.write_files
+    monkeypatch.setattr(ca.archiver, "write_files", lambda *args: written.append(args) or write_files(*args))
+    monkeypatch.setattr(ca.archiver, "write_file", lambda *args: pytest.fail("write_file should not be called"))
+
+    assert ca.write_tags(md_saved, ["cr"])
+    assert len(written) == 1
+    assert ca.read_tags("cr").series == md_saved.series
+
+
+@pytest.mark.xfail(not comicapi.archivers.rar.rar_support, reason="rar support")
+def test_rar_obj_cached(tmp_path, monkeypatch):
+    class FakeInfo:
+        def __init__(self, filename: str, data: bytes) -> None:
+            self.filename = filename
+            self.file_size = len(data)
+            self.data = data
+
+    class FakeRarFile:
+        opened = 0
+
+        def __init__(self, path: str) -> None:
+            FakeRarFile.opened += 1
+            self.infos = [FakeInfo("page1.jpg", b"page 1"), FakeInfo("page2.jpg", b"page 2")]
+
+        def infolist(self):
+            return self.infos
+
+        def open(self, info):
+            return io.BytesIO(info.data)
+
+    monkeypatch.setattr(comicapi.archivers.rar.rarfile, "RarFile", FakeRarFile)
+    comic_path = tmp_path / "cached.cbr"
+    comic_path.write_bytes(b"Rar!")
+
+    archiver = comicapi.archivers.rar.RarArchiver.open(comic_path)
+    assert archiver.get_filename_list() == ["page1.jpg", "page2.jpg"]
+    assert archiver.read_file("page1.jpg") == b"page 1"
+    assert archiver.read_file("page2.jpg") == b"page 2"
+    assert FakeRarFile.opened == 1
+
+    # Modifying the file on disk invalidates the cached object
+    comic_path.write_bytes(b"Rar!!")
+    assert archiver.read_file("page1.jpg") == b"page 1"
+    assert FakeRarFile.opened == 2
+
+
+def test_get_pages(tmp_path, monkeypatch):
+    comic_path = tmp_path / "pages.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        for i in range(3):
+            zf.writestr(f"page{i}.jpg", f"page {i}".encode())
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+
+    calls = []
+    read_files = ca.archiver.read_files
+    monkeypatch.setattr(ca.archiver, "read_files", lambda files: calls.append(files) or read_files(files))
+
+    assert dict(ca.get_pages([2, 0, 5])) == {0: b"page 0", 2: b"page 2", 5: b""}
+    assert calls == [["page2.jpg", "page0.jpg"]]
+
+
+@pytest.mark.xfail(not comicapi.archivers.sevenzip.z7_support, reason="7z support")
+def test_7z_read_files(tmp_path):
+    import py7zr
+
+    comic_path = tmp_path / "pages.cb7"
+    with py7zr.SevenZipFile(comic_path, "w") as zf:
+        for i in range(10):
+            zf.writestr(f"page {i}".encode(), f"page{i}.jpg")
+
+    archiver = comicapi.archivers.sevenzip.SevenZipArchiver.open(comic_path)
+    names = archiver.get_filename_list()
+    assert dict(archiver.read_files(names)) == {f"page{i}.jpg": f"page {i}".encode() for i in range(10)}
+    assert archiver.read_file("page3.jpg") == b"page 3"
+
+    # Stopping early cancels the extraction
+    pages = archiver.read_files(names)
+    assert next(pages)[0] == "page0.jpg"
+    pages.close()
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_iter_pages(tmp_path, workers):
+    comic_path = tmp_path / "pages.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        for i in range(20):
+            zf.writestr(f"page{i:02}.jpg", f"page {i}".encode())
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+
+    indices = [5, 1, 19, 1, 30, 0]
+    expected = [(i, f"page {i}".encode() if i < 20 else b"") for i in indices]
+    assert list(ca.iter_pages(indices, workers=workers)) == expected
+
+
+@pytest.mark.xfail(not comicapi.archivers.sevenzip.z7_support, reason="7z support")
+def test_iter_pages_bulk(tmp_path):
+    import py7zr
+
+    comic_path = tmp_path / "pages.cb7"
+    with py7zr.SevenZipFile(comic_path, "w") as zf:
+        for i in range(10):
+            zf.writestr(f"page {i}".encode(), f"page{i}.jpg")
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+
+    indices = [9, 2, 2, 0]
+    assert list(ca.iter_pages(indices)) == [(i, f"page {i}".encode()) for i in indices]
+
+
+@pytest.mark.xfail(not comicapi.archivers.sevenzip.z7_support, reason="7z support")
+def test_7z_write_files_ignores_comment(tmp_path):
+    import py7zr
+
+    comic_path = tmp_path / "write_files.cb7"
+    with py7zr.SevenZipFile(comic_path, "w") as zf:
+        zf.writestr(b"page 0", "page0.jpg")
+    archiver = comicapi.archivers.sevenzip.SevenZipArchiver.open(comic_path)
+
+    assert archiver.write_files({"ComicInfo.xml": b"<ComicInfo/>"}, "comment")
+    assert archiver.read_file("ComicInfo.xml") == b"<ComicInfo/>"
+
+
+def test_iter_pages_bulk_bounded(tmp_path, monkeypatch):
+    comic_path = tmp_path / "pages.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        for i in range(20):
+            zf.writestr(f"page{i:02}.jpg", f"page {i}".encode())
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+
+    bulk_reads = []
+
+    def read_files(self, archive_files):
+        bulk_reads.append(len(archive_files))
+        # Yield in archive order
+        for name in sorted(archive_files):
+            yield name, self.read_file(name)
+
+    monkeypatch.setattr(comicapi.comicarchive.ZipArchiver, "read_files", read_files)
+
+    assert list(ca.iter_pages(range(20), workers=2)) == [(i, f"page {i}".encode()) for i in range(20)]
+    assert bulk_reads == [20]
+
+    # Only workers * 2 pages are held, the pages that did not fit are read by another bulk read
+    bulk_reads.clear()
+    indices = list(range(19, -1, -1))
+    assert list(ca.iter_pages(indices, workers=2)) == [(i, f"page {i}".encode()) for i in indices]
+    assert bulk_reads == [20, 15, 10, 5]
+
+    indices = [19, 3, 19, 0, 3, 12]
+    assert list(ca.iter_pages(indices, workers=1)) == [(i, f"page {i}".encode()) for i in indices]
+
+
+def test_sniff_skips_is_valid(tmp_path, monkeypatch):
+    not_comic = tmp_path / "cover.jpg"
+    not_comic.write_bytes(b"\xff\xd8\xff\xe0" + b"\x00" * 100)
+    comic_path = tmp_path / "comic.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        zf.writestr("page1.jpg", b"page 1")
+        zf.comment = b"c" * 1000
+
+    comicapi.comicarchive.load_archive_plugins()
+    checked = []
+    for archiver in comicapi.comicarchive.archivers:
+        is_valid = archiver.is_valid
+        monkeypatch.setattr(
+            archiver, "is_valid", classmethod(lambda cls, path, f=is_valid: checked.append(cls) or f(path))
+        )
+
+    assert comicapi.comicarchive.ComicArchive(not_comic).archiver.name() == "Unknown"
+    assert checked == []
+
+    assert comicapi.comicarchive.ComicArchive(comic_path).archiver.name() == "ZIP"
+    assert checked == [comicapi.archivers.zip.ZipArchiver]
+
+    checked.clear()
+    assert comicapi.comicarchive.ComicArchive(tmp_path).archiver.name() == "Folder"
+    assert checked == [comicapi.archivers.FolderArchiver]
+
+
+def test_rar_is_writable_cached(tmp_path, monkeypatch):
+    calls = []
+
+    def run(args, **kwargs):
+        calls.append(args)
+        return subprocess.CompletedProcess(args, 0, b"RAR 7.00   Copyright (c) 1993-2024 Alexander Roshal\n", b"")
+
+    monkeypatch.setattr(comicapi.archivers.rar.subprocess, "run", run)
+    monkeypatch.setattr(comicapi.archivers.rar.shutil, "which", lambda exe: exe)
+    comicapi.archivers.rar.clear_tool_cache()
+
+    archivers = [comicapi.archivers.rar.RarArchiver.open(tmp_path / f"{i}.cbr") for i in range(5)]
+    assert all(archiver.is_writable() for archiver in archivers)
+    assert len(calls) == 1
+
+    comicapi.archivers.rar.clear_tool_cache()
+    assert archivers[0].is_writable()
+    assert len(calls) == 2
+    comicapi.archivers.rar.clear_tool_cache()
+
+
+def test_rar_open_sets_up_tool(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(comicapi.archivers.rar, "rar_support", True)
+    monkeypatch.setattr(comicapi.archivers.rar, "_tool_setup", lambda exe: calls.append(exe) or True)
+    monkeypatch.setattr(comicapi.archivers.rar.RarArchiver, "exe", "/opt/rar/rar")
+
+    comicapi.archivers.rar.RarArchiver.open(tmp_path / "a.cbr")
+    assert calls == ["/opt/rar/rar"]
+
+
+def test_calc_page_sizes_probe(tmp_path, monkeypatch):
+    comic_path = tmp_path / "sizes.cbz"
+    with zipfile.ZipFile(comic_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for i, size in enumerate([(100, 150), (300, 150)]):
+            buf = io.BytesIO()
+            PIL.Image.new("RGB", size).save(buf, "PNG")
+            zf.writestr(f"page{i}.png", buf.getvalue())
+        zf.writestr("page2.png", b"not a png")
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    full_reads = []
+    read_file = ca.archiver.read_file
+    monkeypatch.setattr(ca.archiver, "read_file", lambda name: full_reads.append(name) or read_file(name))
+
+    md = comicapi.genericmetadata.GenericMetadata()
+    ca.apply_archive_info_to_metadata(md, calc_page_sizes=True, detect_double_page=True)
+
+    assert [(p.width, p.height, p.double_page) for p in md.pages[:2]] == [(100, 150, False), (300, 150, True)]
+    assert md.pages[0].byte_size == ca.archiver.get_file_size("page0.png")
+    # Only the page that is not a valid image is read completely
+    assert full_reads == ["page2.png"]
+    assert md.pages[2].byte_size == len(b"not a png")
+
+
+def test_calc_page_sizes_missing_pages(tmp_path, caplog):
+    comic_path = tmp_path / "sizes.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        for i in range(2):
+            buf = io.BytesIO()
+            PIL.Image.new("RGB", (100, 150)).save(buf, "JPEG")
+            zf.writestr(f"page{i}.jpg", buf.getvalue())
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+
+    md = comicapi.genericmetadata.GenericMetadata()
+    md.apply_default_page_list([f"page{i}.jpg" for i in range(4)])
+    with caplog.at_level(logging.ERROR):
+        ca.apply_archive_info_to_metadata(md, calc_page_sizes=True)
+
+    assert [(p.width, p.height) for p in md.pages[:2]] == [(100, 150), (100, 150)]
+    assert not caplog.records
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_calc_page_sizes_workers(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(comicapi.comicarchive.ComicArchive, "page_workers", workers)
+    comic_path = tmp_path / "sizes.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        for i in range(10):
+            buf = io.BytesIO()
+            PIL.Image.new("RGB", (100 + i, 200)).save(buf, "JPEG")
+            zf.writestr(f"page{i}.jpg", buf.getvalue())
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+
+    progress = []
+    md = comicapi.genericmetadata.GenericMetadata()
+    ca.apply_archive_info_to_metadata(md, True, True, lambda done, total: progress.append((done, total)))
+
+    assert [(p.width, p.height) for p in md.pages] == [(100 + i, 200) for i in range(10)]
+    assert progress == [(i, 10) for i in range(1, 11)]
+
+
+def test_folder_listing_cached(tmp_path, monkeypatch):
+    comic_path = tmp_path / "comic"
+    (comic_path / "sub").mkdir(parents=True)
+    (comic_path / "page1.jpg").write_bytes(b"page 1")
+    (comic_path / "sub" / "page2.jpg").write_bytes(b"page 2")
+    archiver = comicapi.archivers.FolderArchiver.open(comic_path)
+
+    assert sorted(archiver.get_filename_list()) == ["page1.jpg", "sub/page2.jpg"]
+
+    scans = []
+    scan = archiver._scan
+    monkeypatch.setattr(archiver, "_scan", lambda: scans.append(1) or scan())
+    assert sorted(archiver.get_filename_list()) == ["page1.jpg", "sub/page2.jpg"]
+    assert scans == []
+
+    # Our own writes invalidate the listing
+    assert archiver.write_file("ComicInfo.xml", b"<ComicInfo/>")
+    assert "ComicInfo.xml" in archiver.get_filename_list()
+    assert len(scans) == 1
+
+    # A change to any listed directory invalidates the listing
+    (comic_path / "sub" / "page3.jpg").write_bytes(b"page 3")
+    os.utime(comic_path / "sub", ns=(0, 0))
+    assert "sub/page3.jpg" in archiver.get_filename_list()
+    assert len(scans) == 2
+
+
+def test_fingerprint(tmp_path, monkeypatch):
+    comic_path = tmp_path / "fingerprint.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        zf.writestr("page1.jpg", b"page 1")
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    fingerprint = ca.fingerprint()
+
+    monkeypatch.setattr(ca.archiver, "read_file", lambda name: pytest.fail("file data should not be read"))
+    ca.rename(tmp_path / "renamed.cbz")
+    assert comicapi.comicarchive.ComicArchive(tmp_path / "renamed.cbz").fingerprint() == fingerprint
+    monkeypatch.undo()
+
+    assert ca.write_tags(comicapi.genericmetadata.md_test, "cr")
+    assert ca.fingerprint() != fingerprint
+
+
+def test_fingerprint_folder(tmp_path):
+    comic_path = tmp_path / "comic"
+    comic_path.mkdir()
+    (comic_path / "page1.jpg").write_bytes(b"page 1")
+    fingerprint = comicapi.comicarchive.ComicArchive(comic_path).fingerprint()
+    assert comicapi.comicarchive.ComicArchive(comic_path).fingerprint() == fingerprint
+
+    (comic_path / "page2.jpg").write_bytes(b"page 2")
+    assert comicapi.comicarchive.ComicArchive(comic_path).fingerprint() != fingerprint
+
+
+def test_read_tags_cached(tmp_path, monkeypatch, md_saved):
+    comic_path = tmp_path / "tags.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        zf.writestr("page1.jpg", b"page 1")
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    assert ca.write_tags(md_saved, "cr")
+
+    reads = []
+    read_file = ca.archiver.read_file
+    monkeypatch.setattr(ca.archiver, "read_file", lambda name: reads.append(name) or read_file(name))
+
+    assert ca.has_tags("cr")
+    md = ca.read_tags("cr")
+    assert md.series == md_saved.series
+    assert reads == ["ComicInfo.xml"]
+
+    # Changes to the returned metadata do not affect the cache
+    md.series = "changed"
+    assert ca.read_tags("cr").series == md_saved.series
+    assert reads == ["ComicInfo.xml"]
+
+    # Writing invalidates the cache
+    assert ca.write_tags(md, "cr")
+    reads.clear()
+    assert ca.read_tags("cr").series == "changed"
+    assert reads == ["ComicInfo.xml"]
+
+    assert ca.remove_tags("cr")
+    assert not ca.has_tags("cr")
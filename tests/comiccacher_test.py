@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import concurrent.futures
+import gc
 import json
+import sqlite3
+import threading
 
 import pytest
 
@@ -57,3 +61,166 @@ def test_cache_overwrite(comic_cache, series_info):
 
     # Validate that the Series marked complete is still in the cache
     assert vi == cache_result
+
+
+def test_connection_reused(comic_cache):
+    con = comic_cache._connect()
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    comic_cache.add_series_info("test", comictalker.comiccacher.Series(id="1", data=b"data"), True)
+    assert comic_cache.get_series_info("1", "test")[0].data == b"data"
+    assert comic_cache._connect() is con
+
+    # Other threads get their own connection
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        assert executor.submit(comic_cache._connect).result() is not con
+        assert executor.submit(comic_cache.get_series_info, "1", "test").result()[0].data == b"data"
+
+
+def test_clear_cache(comic_cache):
+    comic_cache.add_series_info("test", comictalker.comiccacher.Series(id="1", data=b"data"), True)
+    comic_cache.clear_cache()
+    assert not comic_cache.db_file.exists()
+
+    # The cache is re-created when it is next used
+    assert comic_cache.get_series_info("1", "test") is None
+    comic_cache.add_series_info("test", comictalker.comiccacher.Series(id="1", data=b"data"), True)
+    assert comic_cache.get_series_info("1", "test")[0].data == b"data"
+
+
+def test_get_cacher(tmp_path, mock_version):
+    cacher = comictalker.comiccacher.get_cacher(tmp_path, mock_version[0])
+    assert comictalker.comiccacher.get_cacher(tmp_path, mock_version[0]) is cacher
+    comictalker.comiccacher.close_cachers()
+
+
+def test_issue_info_many(comic_cache):
+    issues = [comictalker.comiccacher.Issue(id=str(x), series_id="1", data=str(x).encode()) for x in range(1200)]
+    comic_cache.add_issues_info("test", issues, False)
+
+    cached = comic_cache.get_issue_info_many([str(x) for x in range(0, 1300, 2)], "test")
+    assert set(cached) == {str(x) for x in range(0, 1200, 2)}
+    assert all(issue.data == issue.id.encode() and not complete for issue, complete in cached.values())
+
+    comic_cache.add_issues_info("test", issues[:2], True)
+    comic_cache.add_issues_info(
+        "test", [comictalker.comiccacher.Issue(id="0", series_id="1", data=b"incomplete")], False
+    )  # Incomplete issues don't replace complete ones
+    assert comic_cache.get_issue_info_many(["0", "1"], "test") == {
+        "0": (issues[0], True),
+        "1": (issues[1], True),
+    }
+
+
+def test_expire_stale_records(comic_cache):
+    def add_stale_issue():
+        comic_cache.add_issues_info("test", [comictalker.comiccacher.Issue(id="1", series_id="1", data=b"data")], True)
+        with comic_cache._connect() as con:
+            con.execute("UPDATE Issues SET timestamp = '2000-01-01 00:00:00'")
+
+    add_stale_issue()
+    assert comic_cache.get_issue_info("1", "test") is None
+
+    # Expiry only runs once per expire_interval
+    add_stale_issue()
+    assert comic_cache.get_issue_info("1", "test")[0].data == b"data"
+
+    with comic_cache._connect() as con:
+        comic_cache.expire_stale_records(con.cursor(), "Issues", force=True)
+    assert comic_cache.get_issue_info("1", "test") is None
+
+
+def test_indexes(comic_cache):
+    con = comic_cache._connect()
+    plan = con.execute("EXPLAIN QUERY PLAN SELECT * FROM Issues WHERE series_id=? AND source=?", ["1", "test"])
+    assert "IssuesSeries" in " ".join(row[-1] for row in plan)
+
+
+def test_cache_kept_across_versions(config, comic_cache):
+    comic_cache.add_series_info("test", comictalker.comiccacher.Series(id="1", data=b"data"), True)
+    comic_cache.close()
+
+    cacher = comictalker.comiccacher.ComicCacher(config[0].Runtime_Options__config.user_cache_dir, "999.0.0")
+    assert cacher.schema_version() == comictalker.comiccacher.SCHEMA_VERSION
+    assert cacher.get_series_info("1", "test")[0].data == b"data"
+    cacher.close()
+
+
+def test_migrate_unversioned_cache(config, mock_version):
+    cache_folder = config[0].Runtime_Options__config.user_cache_dir
+    cache_folder.mkdir(parents=True, exist_ok=True)
+    (cache_folder / "cache_version.txt").write_text("1.0.0")
+    con = sqlite3.connect(cache_folder / "comic_cache.db")
+    with con:
+        for sql in comictalker.comiccacher._tables.values():
+            con.execute(sql)
+        con.execute("INSERT INTO Series (id, source, data, complete) VALUES ('1', 'test', ?, 1)", [b"data"])
+    con.close()
+
+    cacher = comictalker.comiccacher.ComicCacher(cache_folder, mock_version[0])
+    assert cacher.get_series_info("1", "test")[0].data == b"data"
+    assert cacher.schema_version() == comictalker.comiccacher.SCHEMA_VERSION
+    assert cacher._connect().execute("SELECT * FROM sqlite_master WHERE name = 'IssuesSeries'").fetchone()
+    assert not (cache_folder / "cache_version.txt").exists()
+    cacher.close()
+
+
+def test_newer_schema_cleared(comic_cache):
+    comic_cache.add_series_info("test", comictalker.comiccacher.Series(id="1", data=b"data"), True)
+    with comic_cache._connect() as con:
+        con.execute(f"PRAGMA user_version = {comictalker.comiccacher.SCHEMA_VERSION + 1}")
+    comic_cache.close()
+
+    assert comic_cache.get_series_info("1", "test") is None
+    assert comic_cache.schema_version() == comictalker.comiccacher.SCHEMA_VERSION
+
+
+def test_compressed_payloads(comic_cache):
+    data = json.dumps(search_results).encode("utf-8")
+    comic_cache.add_series_info("test", comictalker.comiccacher.Series(id="1", data=data), True)
+    assert comic_cache.get_series_info("1", "test")[0].data == data
+
+    stats = comic_cache.stats()
+    assert stats["Series"] == 1
+    assert 0 < stats["payload_size"] < len(data)
+    assert stats["db_size"] > 0
+
+
+def test_thread_connections_closed(comic_cache):
+    comic_cache._connect()
+
+    def use_cache():
+        comic_cache.get_series_info("1", "test")
+
+    for _ in range(20):
+        thread = threading.Thread(target=use_cache)
+        thread.start()
+        thread.join()
+    gc.collect()
+
+    assert len(comic_cache._connections) == 1
+
+
+def test_close_keeps_other_thread_connections(comic_cache):
+    connected = threading.Event()
+    closed = threading.Event()
+    results = []
+
+    def use_cache():
+        con = comic_cache._connect()
+        connected.set()
+        closed.wait()
+        results.append(con.execute("SELECT 1").fetchone()[0])
+        results.append(comic_cache._connect() is not con)
+        try:
+            con.execute("SELECT 1")
+        except sqlite3.ProgrammingError:
+            results.append("closed")
+
+    thread = threading.Thread(target=use_cache)
+    thread.start()
+    connected.wait()
+    comic_cache.close()
+    closed.set()
+    thread.join()
+
+    assert results == [1, True, "closed"]
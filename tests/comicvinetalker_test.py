@@ -5,6 +5,7 @@ import json
 import pytest
 
 import comicapi.genericmetadata
+import comictalker.talkers.comicvine
 import testing.comicvine
 
 
@@ -78,3 +79,14 @@ def test_fetch_issue_data(comicvine_api, series_id, issue_number, expected):
     results = comicvine_api._fetch_issue_data(series_id, issue_number)
     results.notes = None
     assert results == expected
+
+
+def test_cache_projection(comicvine_api, comic_cache):
+    comicvine_api.fetch_comic_data(140529)
+    cached = json.loads(comic_cache.get_issue_info(140529, comicvine_api.id)[0].data)
+    assert set(cached) <= comictalker.talkers.comicvine._cached_issue_fields
+    assert set(testing.comicvine.cv_issue_result["results"]) - set(cached)
+
+    comicvine_api.cache_all_fields = True
+    issue = testing.comicvine.cv_issue_result["results"]
+    assert json.loads(comicvine_api._cache_payload(comictalker.talkers.comicvine._cached_issue_fields, issue)) == issue
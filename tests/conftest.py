@@ -100,6 +100,11 @@ def cv_requests_get(monkeypatch, cbz, comic_cache) -> unittest.mock.Mock:
                     for cv in cv_list["results"]:
                         comicvine.filter_field_list(cv, kwargs)
                     return comicvine.MockResponse(cv_list)
+            if args[0].startswith("https://comicvine.gamespot.com/api/volumes/") and "id:23437" in flt:
+                cv_list = make_list(comicvine.cv_volume_result)
+                for cv in cv_list["results"]:
+                    comicvine.filter_field_list(cv, kwargs)
+                return comicvine.MockResponse(cv_list)
             if (
                 args[0].startswith("https://comicvine.gamespot.com/api/search")
                 and "params" in kwargs
@@ -233,4 +238,6 @@ def plugin_config(tmp_path):
 
 @pytest.fixture
 def comic_cache(config, mock_version) -> Generator[comictalker.comiccacher.ComicCacher, Any, None]:
-    yield comictalker.comiccacher.ComicCacher(config[0].Runtime_Options__config.user_cache_dir, mock_version[0])
+    cacher = comictalker.comiccacher.ComicCacher(config[0].Runtime_Options__config.user_cache_dir, mock_version[0])
+    yield cacher
+    cacher.close()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+from PIL import Image
+
+import comicapi.imagesize
+
+formats = [
+    pytest.param("JPEG", {}, id="jpeg"),
+    pytest.param("JPEG", {"progressive": True}, id="progressive jpeg"),
+    pytest.param("JPEG", {"exif": b"Exif\x00\x00" + b"\x00" * 20000}, id="jpeg with exif"),
+    pytest.param("PNG", {}, id="png"),
+    pytest.param("GIF", {}, id="gif"),
+    pytest.param("BMP", {}, id="bmp"),
+    pytest.param("WEBP", {}, id="webp"),
+    pytest.param("WEBP", {"lossless": True}, id="lossless webp"),
+]
+
+
+@pytest.mark.parametrize("fmt, options", formats)
+def test_get_image_size(fmt, options):
+    buf = io.BytesIO()
+    Image.new("RGB", (123, 45)).save(buf, fmt, **options)
+    data = buf.getvalue()
+
+    assert comicapi.imagesize.get_image_size(data[: comicapi.imagesize.probe_size]) == (123, 45)
+
+
+def test_webp_extended():
+    buf = io.BytesIO()
+    Image.new("RGBA", (1234, 567), (0, 0, 0, 0)).save(buf, "WEBP")
+    assert comicapi.imagesize.get_image_size(buf.getvalue()) == (1234, 567)
+
+
+def test_heif_size():
+    def box(box_type: bytes, content: bytes) -> bytes:
+        return (len(content) + 8).to_bytes(4, "big") + box_type + content
+
+    def ispe(width: int, height: int) -> bytes:
+        return box(b"ispe", b"\x00" * 4 + width.to_bytes(4, "big") + height.to_bytes(4, "big"))
+
+    ipco = box(b"ipco", ispe(512, 512) + ispe(1024, 1536))
+    data = box(b"ftyp", b"avif\x00\x00\x00\x00") + box(b"meta", b"\x00" * 4 + box(b"iprp", ipco))
+    assert comicapi.imagesize.get_image_size(data) == (1024, 1536)
+
+
+def test_truncated():
+    buf = io.BytesIO()
+    Image.new("RGB", (10, 10)).save(buf, "PNG")
+    assert comicapi.imagesize.get_image_size(buf.getvalue()[:20]) is None
+    assert comicapi.imagesize.get_image_size(b"not an image") is None
@@ -1,10 +1,19 @@
 from __future__ import annotations
 
+import io
+import json
+import pathlib
+import zipfile
+
+import PIL.Image
+import pytest
 import settngs
 
 import comicapi.comicarchive
 import comicapi.genericmetadata
+import comicapi.libraryindex
 import comictaggerlib.resulttypes
+import comictaggerlib.watch
 from comictaggerlib import ctsettings
 from comictaggerlib.cli import CLI
 from comictalker.comictalker import ComicTalker
@@ -146,3 +155,103 @@ def test_rename(
 
     # Validate that we got the correct metadata back
     assert md == md_saved
+
+
+def test_scan(config, tmp_path, md_saved, monkeypatch, capsys) -> None:
+    monkeypatch.setattr(comicapi.comicarchive.ComicArchive, "library_index", None)
+    library = tmp_path / "library"
+    (library / "sub").mkdir(parents=True)
+    page = io.BytesIO()
+    PIL.Image.new("RGB", (100, 150)).save(page, "JPEG")
+    for name in ("a.cbz", "sub/b.cbz"):
+        with zipfile.ZipFile(library / name, "w") as zf:
+            zf.writestr("page1.jpg", page.getvalue())
+    md_saved = md_saved.replace(pages=[])
+    assert comicapi.comicarchive.ComicArchive(library / "a.cbz").write_tags(md_saved, "cr")
+    (library / "notes.txt").write_text("not a comic")
+
+    config[0].Commands__command = comictaggerlib.resulttypes.Action.scan
+    config[0].Runtime_Options__files = [str(library)]
+
+    def scan() -> dict[str, str]:
+        assert CLI(config[0], {}).run() == 0
+        lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert "summary" in lines[-1]
+        return {pathlib.Path(line["path"]).name: line["status"] for line in lines[:-1]}
+
+    assert scan() == {"a.cbz": "new", "b.cbz": "new", "notes.txt": "invalid"}
+    index = comicapi.comicarchive.ComicArchive.library_index
+    assert index is not None
+    assert index.get(library / "a.cbz").tags["cr"].series == md_saved.series
+
+    assert index.get_stat(library / "notes.txt")[3] is False
+
+    with monkeypatch.context() as m:
+        # Nothing changed, files that are not archives are not sniffed again either
+        m.setattr(comicapi.comicarchive.ComicArchive, "__init__", lambda *args: pytest.fail("no file should be opened"))
+        assert scan() == {"a.cbz": "unchanged", "b.cbz": "unchanged", "notes.txt": "invalid"}
+
+    (library / "sub" / "b.cbz").unlink()
+    with monkeypatch.context() as m:
+        # Change the archive without updating the index
+        m.setattr(comicapi.comicarchive.ComicArchive, "library_index", None)
+        assert comicapi.comicarchive.ComicArchive(library / "a.cbz").write_tags(
+            md_saved.replace(series="changed"), "cr"
+        )
+    assert scan() == {"a.cbz": "changed", "b.cbz": "removed", "notes.txt": "invalid"}
+    assert index.get(library / "a.cbz").tags["cr"].series == "changed"
+    assert index.get(library / "sub" / "b.cbz") is None
+
+
+def test_query(config, tmp_path, monkeypatch, capsys) -> None:
+    index = comicapi.libraryindex.LibraryIndex(tmp_path / "library_index.db")
+    monkeypatch.setattr(comicapi.comicarchive.ComicArchive, "library_index", index)
+    md = comicapi.genericmetadata.GenericMetadata(series="Batman", year=1995)
+    index.put(tmp_path / "a.cbz", comicapi.libraryindex.IndexEntry(1, 2, 3, "fingerprint", "ZIP", [], {"cr": md}))
+    index.put(tmp_path / "b.cbz", comicapi.libraryindex.IndexEntry(1, 2, 3, "fingerprint", "ZIP", [], {}))
+
+    config[0].Commands__command = comictaggerlib.resulttypes.Action.query
+    assert CLI(config[0], {}).query("series:batman year>=1990") == 0
+    assert capsys.readouterr().out.splitlines() == [str(tmp_path / "a.cbz")]
+
+    config[0].Runtime_Options__json = True
+    assert CLI(config[0], {}).query("missing:cr") == 0
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == [
+        {"path": str(tmp_path / "b.cbz"), "tags": {}}
+    ]
+
+    assert CLI(config[0], {}).query("year>=abc") == 1
+
+
+def test_watch(config, tmp_path, monkeypatch, capsys) -> None:
+    monkeypatch.setattr(comicapi.comicarchive.ComicArchive, "library_index", None)
+    library = tmp_path / "library"
+    library.mkdir()
+    page = io.BytesIO()
+    PIL.Image.new("RGB", (100, 150)).save(page, "JPEG")
+    with zipfile.ZipFile(library / "a.cbz", "w") as zf:
+        zf.writestr("page1.jpg", page.getvalue())
+
+    # Stop watching after the first batch
+    iterate = comictaggerlib.watch.Watcher.__iter__
+
+    def first_batch(self):
+        yield next(iterate(self))
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(comictaggerlib.watch.Watcher, "__iter__", first_batch)
+
+    config[0].Commands__command = comictaggerlib.resulttypes.Action.print
+    config[0].Runtime_Options__json = True
+    config[0].Runtime_Options__watch = True
+    config[0].Runtime_Options__watch_settle = 0.1
+    config[0].Runtime_Options__files = [str(library)]
+
+    assert CLI(config[0], {}).run() == 0
+    assert json.loads(capsys.readouterr().out)["original_path"] == str(library / "a.cbz")
+
+    # a.cbz was processed before the restart, b.cbz arrived while stopped
+    with zipfile.ZipFile(library / "b.cbz", "w") as zf:
+        zf.writestr("page1.jpg", page.getvalue())
+    assert CLI(config[0], {}).run() == 0
+    assert json.loads(capsys.readouterr().out)["original_path"] == str(library / "b.cbz")
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import io
+import os
+import zipfile
+
+import PIL.Image
+import pytest
+
+import comicapi.comicarchive
+import comicapi.genericmetadata
+import comicapi.libraryindex
+
+
+@pytest.fixture
+def library_index(tmp_path, monkeypatch):
+    index = comicapi.libraryindex.LibraryIndex(tmp_path / "cache" / "library_index.db")
+    monkeypatch.setattr(comicapi.comicarchive.ComicArchive, "library_index", index)
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def comic_path(tmp_path, md_saved):
+    comic_path = tmp_path / "indexed.cbz"
+    with zipfile.ZipFile(comic_path, "w") as zf:
+        for i in range(3):
+            buf = io.BytesIO()
+            PIL.Image.new("RGB", (400, 600)).save(buf, "JPEG")
+            zf.writestr(f"page{i}.jpg", buf.getvalue())
+    assert comicapi.comicarchive.ComicArchive(comic_path).write_tags(md_saved, "cr")
+    yield comic_path
+
+
+def test_index_entry(tmp_path):
+    index = comicapi.libraryindex.LibraryIndex(tmp_path / "library_index.db")
+    path = tmp_path / "comic.cbz"
+    md = comicapi.genericmetadata.md_test
+    entry = comicapi.libraryindex.IndexEntry(1, 2, 3, "fingerprint", "ZIP", ["page1.jpg"], {"cr": md})
+
+    index.put(path, entry)
+    assert index.get(path) == entry
+
+    index.rename(path, tmp_path / "renamed.cbz")
+    assert index.get(path) is None
+    assert index.get(tmp_path / "renamed.cbz") == entry
+    index.close()
+
+    # A new version drops the index
+    assert (
+        comicapi.libraryindex.LibraryIndex(tmp_path / "library_index.db", "other").get(tmp_path / "renamed.cbz") is None
+    )
+
+
+def test_watched_kept_across_versions(tmp_path, monkeypatch):
+    index = comicapi.libraryindex.LibraryIndex(tmp_path / "library_index.db")
+    index.set_processed(tmp_path / "comic.cbz", "save", 1, 2, 3, None)
+    index.close()
+
+    index = comicapi.libraryindex.LibraryIndex(tmp_path / "library_index.db", "other")
+    assert index.is_processed(tmp_path / "comic.cbz", "save", 1, 2, 3)
+    index.close()
+
+    monkeypatch.setattr(comicapi.libraryindex.LibraryIndex, "watched_schema", 0)
+    index = comicapi.libraryindex.LibraryIndex(tmp_path / "library_index.db", "other")
+    assert not index.is_processed(tmp_path / "comic.cbz", "save", 1, 2, 3)
+    index.close()
+
+
+def test_unchanged_archive_not_opened(library_index, comic_path, md_saved, monkeypatch):
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    assert ca.seems_to_be_a_comic_archive()
+    assert ca.read_tags("cr").series == md_saved.series
+
+    def fail(*args, **kwargs):
+        pytest.fail("the archive should not be opened")
+
+    monkeypatch.setattr(comicapi.comicarchive.ZipArchiver, "is_valid", fail)
+    monkeypatch.setattr(comicapi.comicarchive.ZipArchiver, "get_filename_list", fail)
+    monkeypatch.setattr(comicapi.comicarchive.ZipArchiver, "read_file", fail)
+    monkeypatch.setattr(comicapi.comicarchive, "read_signature", fail)
+
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    assert ca.archiver.name() == "ZIP"
+    assert ca.seems_to_be_a_comic_archive()
+    assert ca.get_number_of_pages() == 3
+    assert ca.has_tags("cr")
+    assert ca.read_tags("cr") == comicapi.comicarchive.ComicArchive(comic_path).read_tags("cr")
+
+
+def test_touched_archive(library_index, comic_path, md_saved, monkeypatch):
+    comicapi.comicarchive.ComicArchive(comic_path).read_tags("cr")
+    os.utime(comic_path, ns=(0, 0))
+
+    read_file = comicapi.comicarchive.ZipArchiver.read_file
+    reads = []
+    monkeypatch.setattr(
+        comicapi.comicarchive.ZipArchiver, "read_file", lambda self, name: reads.append(name) or read_file(self, name)
+    )
+
+    # The contents are the same so the tags are not read again
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    assert ca.read_tags("cr").series == md_saved.series
+    assert reads == []
+    assert library_index.get(comic_path).mtime_ns == 0
+
+
+def test_changed_archive(library_index, comic_path, md_saved):
+    comicapi.comicarchive.ComicArchive(comic_path).read_tags("cr")
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    assert ca.write_tags(md_saved.replace(series="changed"), "cr")
+
+    assert comicapi.comicarchive.ComicArchive(comic_path).read_tags("cr").series == "changed"
+
+    with zipfile.ZipFile(comic_path, "a") as zf:
+        zf.writestr("page3.jpg", b"page 3")
+    assert comicapi.comicarchive.ComicArchive(comic_path).get_number_of_pages() == 4
+
+
+def test_written_tags_indexed(library_index, comic_path, md_saved):
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    assert ca.write_tags(md_saved.replace(series="written"), "cr")
+
+    entry = library_index.get(comic_path)
+    st = comic_path.stat()
+    assert entry[:3] == (st.st_ino, st.st_size, st.st_mtime_ns)
+    assert entry.tags["cr"].series == "written"
+    assert library_index.query("has:cr") == [comic_path]
+    assert library_index.query("missing:cr") == []
+
+    assert comicapi.comicarchive.ComicArchive(comic_path).remove_tags("cr")
+    assert library_index.get(comic_path).tags["cr"].is_empty
+    assert library_index.query("missing:cr") == [comic_path]
+
+
+def test_put_merges_tags(tmp_path):
+    index = comicapi.libraryindex.LibraryIndex(tmp_path / "library_index.db")
+    path = tmp_path / "comic.cbz"
+    cbi = comicapi.genericmetadata.GenericMetadata(series="cbi")
+    cr = comicapi.genericmetadata.GenericMetadata(series="cr")
+
+    index.put(path, comicapi.libraryindex.IndexEntry(1, 2, 3, "fingerprint", "ZIP", [], {"cbi": cbi}))
+    index.put(path, comicapi.libraryindex.IndexEntry(1, 2, 3, "fingerprint", "ZIP", [], {"cr": cr}))
+    assert index.get(path).tags == {"cbi": cbi, "cr": cr}
+    assert index.query("has:cbi has:cr") == [path]
+
+    # The other tags are kept when the archive was written to
+    index.put(path, comicapi.libraryindex.IndexEntry(1, 2, 4, "written", "ZIP", [], {"cr": cr}), "fingerprint")
+    assert index.get(path).tags == {"cbi": cbi, "cr": cr}
+
+    # A different archive replaces the entry
+    index.put(path, comicapi.libraryindex.IndexEntry(1, 2, 5, "changed", "ZIP", [], {"cr": cr}))
+    assert index.get(path).tags == {"cr": cr}
+    assert index.query("has:cbi") == []
+    index.close()
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("", ["a.cbz", "b.cbz", "c.cbz"]),
+        ("series:futuristic", ["a.cbz"]),
+        ("series:'Futuristic Tales'", ["a.cbz"]),
+        ("series=other", ["b.cbz"]),
+        ("year>=2000", ["a.cbz"]),
+        ("year<2000", ["b.cbz"]),
+        ("year:2007 series:other", []),
+        ("credits:naraghi", ["a.cbz"]),
+        ("series!=other", ["a.cbz"]),
+        ("has:cr", ["a.cbz", "b.cbz"]),
+        ("missing:cr", ["c.cbz"]),
+        ("tag:cr year:2007", ["a.cbz"]),
+        ("tag:cbi year:2007", []),
+    ],
+)
+def test_query(tmp_path, query, expected):
+    index = comicapi.libraryindex.LibraryIndex(tmp_path / "library_index.db")
+    tags = {
+        "a.cbz": {"cr": comicapi.genericmetadata.md_test},
+        "b.cbz": {"cr": comicapi.genericmetadata.GenericMetadata(series="Other", year=1990)},
+        "c.cbz": {"cr": comicapi.genericmetadata.GenericMetadata()},
+    }
+    for name, md in tags.items():
+        index.put(tmp_path / name, comicapi.libraryindex.IndexEntry(1, 2, 3, "fingerprint", "ZIP", [], md))
+
+    assert index.query(query) == [tmp_path / name for name in expected]
+    index.close()
+
+
+@pytest.mark.parametrize("query", ["series", "unknown:value", "year>=abc", "missing>=cr", "series:'unclosed"])
+def test_query_invalid(query):
+    with pytest.raises(ValueError):
+        comicapi.libraryindex.parse_query(query)
+
+
+def test_load_cache_single_put(library_index, comic_path, monkeypatch):
+    library_index.remove(comic_path)
+    puts = []
+    put = library_index.put
+    monkeypatch.setattr(library_index, "put", lambda *args: puts.append(args) or put(*args))
+
+    ca = comicapi.comicarchive.ComicArchive(comic_path)
+    ca.load_cache([*comicapi.comicarchive.tags, "cr"])
+    assert len(puts) == 1
+    assert set(library_index.get(ca.path).tags) == set(comicapi.comicarchive.tags)
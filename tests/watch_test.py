@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+import comictaggerlib.watch
+
+
+def wait_for(watcher: comictaggerlib.watch.Watcher, count: int) -> list:
+    ready: list = []
+    deadline = time.monotonic() + 5
+    while len(ready) < count and time.monotonic() < deadline:
+        ready.extend(watcher.wait(0.05))
+    return ready
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher(tmp_path, use_inotify):
+    (tmp_path / "existing.cbz").write_bytes(b"existing")
+    with comictaggerlib.watch.Watcher([tmp_path], settle=0.2, poll_interval=0.05, use_inotify=use_inotify) as watcher:
+        # Files that already exist are settled immediately
+        assert watcher.wait(0) == [tmp_path / "existing.cbz"]
+
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "new.cbz").write_bytes(b"new")
+        partial = tmp_path / "partial.cbz"
+        partial.write_bytes(b"partial")
+        time.sleep(0.1)
+        assert watcher.wait(0) == []
+
+        # Writing again restarts the wait
+        with partial.open("ab") as f:
+            f.write(b" more")
+        assert sorted(wait_for(watcher, 2)) == [partial, tmp_path / "sub" / "new.cbz"]
+        assert watcher.wait(0.3) == []